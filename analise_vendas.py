@@ -0,0 +1,212 @@
+"""Análises de vendas vetorizadas com NumPy sobre uma exportação colunar dos itens vendidos.
+
+Cada item de venda vira uma posição em arrays paralelos (data/hora em
+segundos, índice da venda, índice do produto, quantidade, preço unitário e
+subtotal). Os arrays ficam em disco em arquivos .npy, abertos por mapeamento
+de memória, e a cada atualização só as vendas novas são convertidas:
+
+    colunas = ColunasVendas('vendas.colunas')
+    colunas.atualizar(lista_vendas)
+    print("\\n".join(formatar_analise(colunas.analisar('2024-01-01', '2024-12-31'))))
+"""
+import json
+import os
+
+import numpy as np
+
+VERSAO_CACHE = 1
+COLUNAS = (
+    ('data_hora', np.int64),      # Segundos desde 1970-01-01, contados na hora local gravada nas vendas
+    ('venda', np.int64),          # Índice da venda no histórico
+    ('produto', np.int32),        # Índice do produto em ColunasVendas.codigos
+    ('quantidade', np.int64),
+    ('preco_unitario', np.float64),
+    ('subtotal', np.float64),
+)
+DIAS_SEMANA = ("Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo")
+
+class ColunasVendas:
+    """Itens de venda em formato colunar, com cache em disco mapeado em memória.
+
+    O diretório do cache tem um .npy por coluna e um meta.json com a
+    quantidade de vendas convertidas, a data/hora da primeira e da última
+    (para perceber se o histórico mudou) e a lista de códigos e nomes dos
+    produtos. Como o histórico só recebe vendas no final, 'atualizar'
+    converte apenas as vendas posteriores às do cache; se o histórico não
+    corresponder mais ao cache, ele é refeito.
+    """
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self._reiniciar()
+        self._carregar()
+
+    def _caminho(self, nome):
+        return os.path.join(self.diretorio, nome)
+
+    def _carregar(self):
+        """Abre o cache do disco, se existir e estiver íntegro."""
+        try:
+            with open(self._caminho('meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('versao') != VERSAO_CACHE:
+                return
+            arrays = {coluna: np.load(self._caminho(f"{coluna}.npy"), mmap_mode='r') for coluna, _ in COLUNAS}
+        except (OSError, ValueError):
+            return
+        if any(len(array) != meta['itens'] for array in arrays.values()):
+            return # Gravação interrompida entre os arquivos: o cache é refeito
+        for coluna, array in arrays.items():
+            setattr(self, coluna, array)
+        self.codigos, self.nomes = meta['codigos'], meta['nomes']
+        self.vendas, self._primeira, self._ultima = meta['vendas'], meta['primeira'], meta['ultima']
+        self._indice_produto = {codigo: i for i, codigo in enumerate(self.codigos)}
+
+    def _corresponde(self, lista_vendas):
+        if not self.vendas:
+            return True
+        return (len(lista_vendas) >= self.vendas and lista_vendas[0]['data_hora'] == self._primeira
+                and lista_vendas[self.vendas - 1]['data_hora'] == self._ultima)
+
+    def atualizar(self, lista_vendas):
+        """Converte as vendas que ainda não estão no cache e grava o cache. Retorna quantas foram convertidas."""
+        if not self._corresponde(lista_vendas):
+            self._reiniciar()
+        novas = lista_vendas[self.vendas:]
+        if not novas:
+            return 0
+
+        datas, itens_por_venda = [], []
+        produto, quantidade, preco_unitario, subtotal = [], [], [], []
+        indice_produto, codigos, nomes = self._indice_produto, self.codigos, self.nomes
+        for venda in novas:
+            datas.append(venda['data_hora'])
+            itens_por_venda.append(len(venda['itens']))
+            for item in venda['itens']:
+                indice = indice_produto.get(item['codigo'])
+                if indice is None:
+                    indice = indice_produto[item['codigo']] = len(codigos)
+                    codigos.append(item['codigo'])
+                    nomes.append(item['nome'])
+                produto.append(indice)
+                quantidade.append(item['quantidade'])
+                preco_unitario.append(item['preco_unitario'])
+                subtotal.append(item['subtotal'])
+
+        # A data/hora e o índice de cada venda se repetem para cada um dos seus itens
+        itens_por_venda = np.array(itens_por_venda, dtype=np.int64)
+        segundos = np.array(datas, dtype='datetime64[s]').astype(np.int64)
+        novos = {
+            'data_hora': np.repeat(segundos, itens_por_venda),
+            'venda': np.repeat(np.arange(self.vendas, self.vendas + len(novas), dtype=np.int64), itens_por_venda),
+            'produto': np.array(produto, dtype=np.int32),
+            'quantidade': np.array(quantidade, dtype=np.int64),
+            'preco_unitario': np.array(preco_unitario, dtype=np.float64),
+            'subtotal': np.array(subtotal, dtype=np.float64),
+        }
+        for coluna, _ in COLUNAS:
+            setattr(self, coluna, np.concatenate([getattr(self, coluna), novos[coluna]]))
+        if not self.vendas:
+            self._primeira = novas[0]['data_hora']
+        self.vendas = len(lista_vendas)
+        self._ultima = lista_vendas[-1]['data_hora']
+        self._gravar()
+        return len(novas)
+
+    def _reiniciar(self):
+        self.codigos, self.nomes, self._indice_produto = [], [], {}
+        self.vendas = 0
+        self._primeira = self._ultima = None
+        for coluna, tipo in COLUNAS:
+            setattr(self, coluna, np.empty(0, dtype=tipo))
+
+    def _gravar(self):
+        """Grava cada coluna em um .npy temporário e troca pelo definitivo; o meta.json vem por último."""
+        os.makedirs(self.diretorio, exist_ok=True)
+        for coluna, _ in COLUNAS:
+            temporario = self._caminho(f"{coluna}.tmp.npy")
+            np.save(temporario, getattr(self, coluna))
+            os.replace(temporario, self._caminho(f"{coluna}.npy"))
+        meta = {'versao': VERSAO_CACHE, 'vendas': self.vendas, 'itens': len(self.venda), 'primeira': self._primeira,
+                'ultima': self._ultima, 'codigos': self.codigos, 'nomes': self.nomes}
+        temporario = self._caminho('meta.json.tmp')
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(temporario, self._caminho('meta.json'))
+        self._carregar() # Reabre os arrays gravados por mapeamento de memória
+
+    def _mascara(self, data_inicio=None, data_fim=None):
+        """Máscara dos itens entre as datas 'AAAA-MM-DD' (inclusivas), ou None para todo o período."""
+        if not data_inicio and not data_fim:
+            return None
+        mascara = np.ones(len(self.data_hora), dtype=bool)
+        if data_inicio:
+            mascara &= self.data_hora >= np.datetime64(data_inicio, 's').astype(np.int64)
+        if data_fim:
+            mascara &= self.data_hora < (np.datetime64(data_fim, 'D') + 1).astype('datetime64[s]').astype(np.int64)
+        return mascara
+
+    def analisar(self, data_inicio=None, data_fim=None, quantidade_mais_vendidos=10):
+        """Calcula as análises do período: mais vendidos, receita por hora e dia da semana e tamanho das cestas."""
+        mascara = self._mascara(data_inicio, data_fim)
+        colunas = {coluna: getattr(self, coluna) if mascara is None else getattr(self, coluna)[mascara] for coluna, _ in COLUNAS}
+        subtotal = colunas['subtotal']
+        resultado = {'periodo': (data_inicio, data_fim), 'itens': len(subtotal), 'receita': float(subtotal.sum())}
+        if not len(subtotal):
+            resultado.update(vendas=0, mais_vendidos=[], receita_por_hora=[], receita_por_dia_semana=[], cestas=None)
+            return resultado
+
+        # Mais vendidos (por receita)
+        receita_produto = np.bincount(colunas['produto'], weights=subtotal, minlength=len(self.codigos))
+        unidades_produto = np.bincount(colunas['produto'], weights=colunas['quantidade'], minlength=len(self.codigos))
+        n = min(quantidade_mais_vendidos, np.count_nonzero(unidades_produto))
+        melhores = np.argpartition(-receita_produto, n - 1)[:n] if n < len(receita_produto) else np.arange(len(receita_produto))
+        melhores = melhores[np.argsort(-receita_produto[melhores], kind='stable')][:n]
+        resultado['mais_vendidos'] = [(self.codigos[i], self.nomes[i], int(unidades_produto[i]), float(receita_produto[i]))
+                                      for i in melhores]
+
+        # Receita por hora do dia e por dia da semana (1970-01-01 foi uma quinta-feira)
+        segundos = colunas['data_hora']
+        resultado['receita_por_hora'] = np.bincount((segundos // 3600) % 24, weights=subtotal, minlength=24).tolist()
+        resultado['receita_por_dia_semana'] = np.bincount((segundos // 86400 + 3) % 7, weights=subtotal, minlength=7).tolist()
+
+        # Tamanho das cestas: os itens de uma venda são contíguos, então cada venda começa onde o índice muda
+        venda = colunas['venda']
+        inicios = np.flatnonzero(np.concatenate(([True], venda[1:] != venda[:-1])))
+        linhas = np.diff(np.append(inicios, len(venda)))
+        unidades = np.add.reduceat(colunas['quantidade'], inicios)
+        resultado['vendas'] = len(inicios)
+        resultado['cestas'] = {
+            'linhas_media': float(linhas.mean()),
+            'unidades_media': float(unidades.mean()),
+            'unidades_percentis': dict(zip((50, 90, 99), np.percentile(unidades, (50, 90, 99)).tolist())),
+            'distribuicao_linhas': [(k, int(total)) for k, total in enumerate(np.bincount(linhas)) if total],
+        }
+        return resultado
+
+def formatar_analise(resultado):
+    """Linhas de texto com o resultado de ColunasVendas.analisar."""
+    data_inicio, data_fim = resultado['periodo']
+    descricao = "Todo o Período" if not data_inicio and not data_fim else f"{data_inicio or 'início'} a {data_fim or 'hoje'}"
+    linhas = [f"--- Análise de Vendas ({descricao}) ---", ""]
+    if not resultado['itens']:
+        return linhas + ["Nenhuma venda no período."]
+    linhas.append(f"Vendas: {resultado['vendas']} - Itens: {resultado['itens']} - Receita: R$ {resultado['receita']:.2f}")
+
+    linhas += ["", "Mais vendidos (por receita):"]
+    linhas += [f"  {nome} ({codigo}): {unidades} un. - R$ {receita:.2f}" for codigo, nome, unidades, receita in resultado['mais_vendidos']]
+
+    linhas += ["", "Receita por hora:"]
+    linhas += [f"  {hora:02d}h: R$ {receita:.2f}" for hora, receita in enumerate(resultado['receita_por_hora']) if receita]
+
+    linhas += ["", "Receita por dia da semana:"]
+    linhas += [f"  {DIAS_SEMANA[dia]}: R$ {receita:.2f}" for dia, receita in enumerate(resultado['receita_por_dia_semana'])]
+
+    cestas = resultado['cestas']
+    percentis = cestas['unidades_percentis']
+    linhas += ["", "Tamanho das cestas:",
+               f"  Média de {cestas['linhas_media']:.1f} produtos diferentes e {cestas['unidades_media']:.1f} unidades por venda",
+               f"  Unidades por venda: mediana {percentis[50]:.0f}, p90 {percentis[90]:.0f}, p99 {percentis[99]:.0f}",
+               "  Vendas por quantidade de produtos diferentes:"]
+    linhas += [f"    {k}: {total}" for k, total in cestas['distribuicao_linhas']]
+    return linhas
@@ -0,0 +1,204 @@
+"""Benchmarks do sistema de supermercado com catálogos e históricos de vendas sintéticos.
+
+Gera produtos.json/vendas.json em um diretório temporário, mede os caminhos
+principais do sistema e grava os resultados em JSON para comparar versões:
+
+    python benchmark_supermercado.py --escala pequena --saida base.json
+    python benchmark_supermercado.py --escala pequena --saida novo.json --comparar base.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ESCALAS = {
+    # nome: (quantidade de produtos, quantidade de linhas de venda)
+    'pequena': (1_000, 10_000),
+    'media': (100_000, 1_000_000),
+    'grande': (1_000_000, 10_000_000),
+}
+ITENS_POR_VENDA = 4
+SEMENTE = 1234
+
+# --- Geração dos dados sintéticos ---
+
+def gerar_produtos(quantidade, rng):
+    """Gera uma lista de produtos no formato de produtos.json."""
+    return [{'codigo': f"P{i:07d}", 'nome': f"Produto {i}", 'preco': round(rng.uniform(0.5, 200.0), 2),
+             'estoque': rng.randint(0, 500)} for i in range(quantidade)]
+
+def gerar_vendas(lista_produtos, linhas, rng):
+    """Gera vendas com 'linhas' itens no total, espalhadas pelos últimos 365 dias."""
+    inicio = datetime.now() - timedelta(days=365)
+    lista_vendas = []
+    for _ in range(max(1, linhas // ITENS_POR_VENDA)):
+        itens = []
+        for produto in rng.sample(lista_produtos, min(ITENS_POR_VENDA, len(lista_produtos))):
+            quantidade = rng.randint(1, 5)
+            itens.append({'codigo': produto['codigo'], 'nome': produto['nome'], 'quantidade': quantidade,
+                          'preco_unitario': produto['preco'], 'subtotal': produto['preco'] * quantidade})
+        data_hora = inicio + timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        lista_vendas.append({'data_hora': data_hora.strftime("%Y-%m-%d %H:%M:%S"), 'itens': itens,
+                             'total': sum(item['subtotal'] for item in itens)})
+    lista_vendas.sort(key=lambda venda: venda['data_hora'])
+    return lista_vendas
+
+def preparar_diretorio(diretorio, quantidade_produtos, linhas_venda):
+    rng = random.Random(SEMENTE)
+    lista_produtos = gerar_produtos(quantidade_produtos, rng)
+    with open(os.path.join(diretorio, 'produtos.json'), 'w', encoding='utf-8') as f:
+        json.dump(lista_produtos, f, indent=4, ensure_ascii=False)
+    with open(os.path.join(diretorio, 'vendas.json'), 'w', encoding='utf-8') as f:
+        json.dump(gerar_vendas(lista_produtos, linhas_venda, rng), f, indent=4, ensure_ascii=False)
+    return [produto['codigo'] for produto in lista_produtos]
+
+# --- Medição ---
+
+def medir(resultados, nome, funcao, repeticoes):
+    """Executa 'funcao' 'repeticoes' vezes e registra as estatísticas dos tempos (em segundos)."""
+    tempos = []
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(i)
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    resultados[nome] = {
+        'repeticoes': repeticoes,
+        'total_s': sum(tempos),
+        'media_s': statistics.fmean(tempos),
+        'mediana_s': statistics.median(tempos),
+        'p95_s': tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))],
+        'max_s': tempos[-1],
+    }
+    print(f"  {nome:<36} {resultados[nome]['mediana_s'] * 1000:12.3f} ms (mediana, n={repeticoes})", file=sys.stderr)
+
+def executar_benchmarks(codigos, repeticoes_escrita):
+    """Mede os caminhos do sistema sobre os arquivos do diretório atual."""
+    import supermercado_gui as sg
+    from tkinter import messagebox
+
+    # Os diálogos bloqueariam a medição; aqui eles são apenas descartados
+    for nome in ('showinfo', 'showwarning', 'showerror'):
+        setattr(messagebox, nome, lambda *args, **kwargs: None)
+
+    resultados = {}
+    rng = random.Random(SEMENTE)
+
+    medir(resultados, 'carregar_dados_inicializacao', lambda i: sg.inicializar_dados(), 3)
+    medir(resultados, 'buscar_produto_por_codigo', lambda i: sg.buscar_produto_por_codigo(rng.choice(codigos)), 10_000)
+    medir(resultados, 'construir_indice_nomes', lambda i: sg.IndiceNomes((p['codigo'], p['nome']) for p in sg.produtos), 3)
+    sg.produtos.indice_nomes()
+    # Cada tecla de "produto 1234" e o mesmo texto com um erro de digitação ("prodtuo 1234")
+    digitacoes = [texto[:n] for i in range(50) for texto in (f"produto {rng.randrange(len(codigos))}", f"prodtuo {rng.randrange(len(codigos))}")
+                  for n in range(2, len(texto) + 1)]
+    medir(resultados, 'pesquisar_produtos_por_tecla', lambda i: sg.pesquisar_produtos(digitacoes[i]), len(digitacoes))
+    # Com GRAVACAO_EM_SEGUNDO_PLANO a operação só agenda a gravação; esperar por ela mede o tempo até os dados estarem em disco
+    medir(resultados, 'adicionar_ou_atualizar_produto',
+          lambda i: (sg.adicionar_ou_atualizar_produto(rng.choice(codigos), f"Produto Alterado {i}", "9,90", "1000"),
+                     sg.gravador_json.esperar()),
+          repeticoes_escrita)
+    medir(resultados, 'realizar_venda_logica',
+          lambda i: (sg.realizar_venda_logica([{'codigo': rng.choice(codigos), 'quantidade': 1}]), sg.gravador_json.esperar()),
+          repeticoes_escrita)
+    medir(resultados, 'estoque_baixo_dados', lambda i: sg.produtos.com_estoque_ate(5), 100)
+    medir(resultados, 'carregar_historico_vendas', lambda i: sg.HistoricoVendas(sg.armazenamento.carregar_vendas).agregados(), 3)
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    medir(resultados, 'carregar_vendas_hoje', lambda i: sg.HistoricoVendas(sg.armazenamento.carregar_vendas).periodo(hoje, hoje), 10)
+    medir(resultados, 'resumo_vendas_dados', lambda i: sg.historico_vendas.agregados().resumo(), 100)
+    # Os relatórios da tela são gerados em segundo plano; aqui se mede a geração completa, gravando em CSV
+    medir(resultados, 'relatorio_estoque_baixo_csv', lambda i: sum(1 for _ in sg.gravar_relatorio(sg.relatorio_estoque_baixo(sg.retrato_estoque_baixo(5), 5), 'estoque.csv')), 5)
+    medir(resultados, 'relatorio_vendas_csv', lambda i: sum(1 for _ in sg.gravar_relatorio(sg.relatorio_vendas(tuple(sg.historico_vendas.lista())), 'vendas.csv')), 3)
+    if sg.analise_vendas is not None: # NumPy é opcional
+        medir(resultados, 'analise_vendas_primeira', lambda i: sg.analisar_vendas(), 1)
+        medir(resultados, 'analise_vendas', lambda i: sg.analisar_vendas(), 10)
+    resultados['memoria'] = {'catalogo_bytes': sg.produtos.uso_memoria(), 'historico_bytes': sg.historico_vendas.uso_memoria()}
+
+    # A lista de produtos depende do Tk; só é medida se houver uma tela disponível
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"  (GUI não medida: {e})", file=sys.stderr)
+        return resultados
+    root.withdraw()
+    app = sg.SupermercadoApp(root)
+    medir(resultados, 'atualizar_lista_produtos_gui', lambda i: app.atualizar_lista_produtos_gui(), 5)
+    root.destroy()
+    return resultados
+
+def versao_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(atual, base):
+    """Mostra a razão entre as medianas atuais e as de um resultado anterior."""
+    print(f"\n{'benchmark':<46} {'base (ms)':>12} {'atual (ms)':>12} {'razão':>8}", file=sys.stderr)
+    for escala, dados in atual['escalas'].items():
+        for nome, medida in dados['resultados'].items():
+            anterior = base.get('escalas', {}).get(escala, {}).get('resultados', {}).get(nome)
+            if anterior and 'mediana_s' in anterior:
+                razao = medida['mediana_s'] / anterior['mediana_s'] if anterior['mediana_s'] else float('inf')
+                print(f"{escala + '/' + nome:<46} {anterior['mediana_s'] * 1000:12.3f} {medida['mediana_s'] * 1000:12.3f} {razao:8.2f}",
+                      file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--escala', choices=ESCALAS, nargs='+', default=['pequena'], help="Tamanhos de dados a medir.")
+    parser.add_argument('--produtos', type=int, help="Quantidade de produtos (substitui a escala).")
+    parser.add_argument('--linhas-venda', type=int, help="Quantidade de linhas de venda (substitui a escala).")
+    parser.add_argument('--repeticoes-escrita', type=int, default=20,
+                        help="Repetições das operações que gravam em disco (padrão: 20).")
+    parser.add_argument('--saida', help="Arquivo JSON para os resultados (padrão: saída padrão).")
+    parser.add_argument('--comparar', help="Resultado JSON anterior para comparar.")
+    args = parser.parse_args()
+
+    if args.produtos or args.linhas_venda:
+        escalas = {'personalizada': (args.produtos or ESCALAS['pequena'][0], args.linhas_venda or ESCALAS['pequena'][1])}
+    else:
+        escalas = {nome: ESCALAS[nome] for nome in args.escala}
+
+    relatorio = {
+        'data_hora': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'versao': versao_git(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'escalas': {},
+    }
+    diretorio_original = os.getcwd()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    for nome, (quantidade_produtos, linhas_venda) in escalas.items():
+        with tempfile.TemporaryDirectory(prefix='bench_supermercado_') as diretorio:
+            print(f"Escala {nome}: {quantidade_produtos} produtos, {linhas_venda} linhas de venda", file=sys.stderr)
+            codigos = preparar_diretorio(diretorio, quantidade_produtos, linhas_venda)
+            os.chdir(diretorio) # Os arquivos de dados do sistema são relativos ao diretório atual
+            try:
+                relatorio['escalas'][nome] = {
+                    'parametros': {'produtos': quantidade_produtos, 'linhas_venda': linhas_venda},
+                    'resultados': executar_benchmarks(codigos, args.repeticoes_escrita),
+                }
+            finally:
+                sys.modules['supermercado_gui'].armazenamento.fechar()
+                os.chdir(diretorio_original)
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            comparar(relatorio, json.load(f))
+    saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(saida + '\n')
+    else:
+        print(saida)
+
+if __name__ == "__main__":
+    main()
@@ -1,122 +1,2637 @@
 import tkinter as tk
-from tkinter import messagebox, scrolledtext
+from tkinter import filedialog, messagebox, scrolledtext
 import tkinter.ttk as ttk # Certifique-se de que esta linha está presente
+import asyncio
+import atexit
+import bisect
+import contextlib
+import csv
+import functools
+import gzip
+import heapq
+import itertools
 import json
+import marshal
+import math
+import operator
 import os
-from datetime import datetime
+import queue
+import re
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+
+try:
+    import analise_vendas # Requer NumPy; sem ele a análise de vendas fica indisponível
+except ImportError:
+    analise_vendas = None
 
 # --- Configurações de Arquivo ---
 PRODUTOS_FILE = 'produtos.json'
-VENDAS_FILE = 'vendas.json'
+VENDAS_FILE = 'vendas.json' # Formato antigo (todas as vendas em um arquivo), migrado para VENDAS_PARTICOES_DIR na abertura
+VENDAS_PARTICOES_DIR = 'vendas'
+VENDAS_JOURNAL_FILE = 'vendas.journal.jsonl'
+SQLITE_FILE = 'supermercado.db'
+
+# --- Configurações de Armazenamento ---
+BACKEND_ARMAZENAMENTO = 'json' # 'json' (produtos.json e vendas/AAAA-MM.json), 'sqlite' (SQLITE_FILE) ou 'remoto' (servidor PDV)
+GRAVACAO_EM_SEGUNDO_PLANO = True # No backend JSON, grava produtos.json (e a partição de vendas do mês, sem journal) em uma thread separada
+
+# --- Configurações do Servidor PDV (vários caixas compartilhando o mesmo estoque) ---
+SERVIDOR_PDV_HOST = '127.0.0.1'
+SERVIDOR_PDV_PORTA = 8765
+CLIENTE_SINCRONIZAR_MS = 5000 # Intervalo em que um caixa cliente traz do servidor os produtos alterados por outros caixas
+
+# --- Configurações do Journal de Vendas ---
+USAR_JOURNAL_VENDAS = True     # Grava cada venda como uma linha no journal em vez de reescrever vendas.json
+JOURNAL_FSYNC_A_CADA = 1       # Faz fsync a cada N vendas registradas (0 deixa a cargo do sistema operacional)
+JOURNAL_COMPACTAR_APOS = 5000  # Compacta o journal em segundo plano após N vendas (0 desativa)
+
+# --- Configurações das Partições de Vendas ---
+VENDAS_ARQUIVAR_APOS_MESES = 3 # Mantém sem compressão o mês atual e os N anteriores; os mais antigos vão para AAAA-MM.json.gz (None desativa)
+
+# --- Configurações do Modo Scanner (leitor de código de barras) ---
+SCANNER_INTERVALO_MS = 60 # Leituras que chegam dentro deste intervalo são incluídas no carrinho de uma só vez
+
+# --- Configurações da Busca por Nome ---
+AUTOCOMPLETAR_LIMITE = 10              # Quantidade máxima de sugestões mostradas enquanto se digita
+AUTOCOMPLETAR_MINIMO_CARACTERES = 2    # Só sugere produtos a partir deste tamanho de texto
+BUSCA_CANDIDATOS_APROXIMADOS = 200     # Palavras comparadas por distância de edição para cada termo com erro de digitação
+INDICE_NOMES_VERIFICAR_MS = 50         # Intervalo em que a interface verifica se o índice de nomes montado em segundo plano ficou pronto
+
+# --- Configurações de Importação/Exportação CSV ---
+CSV_DELIMITADOR = ';'       # Separador usado na exportação (a importação detecta ';', ',' ou tabulação)
+CSV_COLUNAS = ('codigo', 'nome', 'preco', 'estoque', 'estoque_minimo')
+IMPORTACAO_CSV_LOTE = 5000  # Linhas lidas, validadas e aplicadas ao catálogo por vez
+
+# --- Configurações da Análise de Vendas (NumPy) ---
+ANALISE_CACHE_DIR = 'vendas.colunas' # Itens de venda em formato colunar (.npy), atualizados só com as vendas novas
+
+# --- Configurações dos Relatórios ---
+RELATORIO_BLOCOS_POR_VEZ = 200  # Blocos (uma venda ou um produto cada) inseridos na tela a cada RELATORIO_INTERVALO_MS
+RELATORIO_INTERVALO_MS = 15
+RELATORIO_FILA_BLOCOS = 2000    # Blocos gerados à frente da tela; com a fila cheia, a geração espera
+
+# --- Configurações da Medição de Desempenho ---
+MEDIR_DESEMPENHO = False             # Registra a duração das operações marcadas com @medir_tempo (também pela aba Desempenho)
+DESEMPENHO_EXPORTAR_ARQUIVO = None   # Arquivo .json ou .csv regravado periodicamente com as latências (None desativa)
+DESEMPENHO_EXPORTAR_A_CADA_S = 60
+DESEMPENHO_ATUALIZAR_TELA_MS = 1000  # Intervalo de atualização da aba Desempenho enquanto ela está aberta
+
+# --- Medição de Desempenho ---
+
+class HistogramaLatencia:
+    """Histograma de durações em baldes de escala logarítmica.
+
+    Cada balde cobre uma faixa 10% maior que a anterior, de 1 µs a cerca de
+    1000 s, então registrar custa O(1) e a memória é fixa; os percentis têm
+    erro relativo de no máximo 10%. Contagem, soma e máximo são exatos.
+    """
+
+    MINIMO_S = 1e-6
+    RAZAO = 1.1
+    BALDES = 220
+
+    def __init__(self):
+        self.contagens = [0] * self.BALDES
+        self.contagem = 0
+        self.total_s = 0.0
+        self.maximo_s = 0.0
+
+    def registrar(self, segundos):
+        indice = int(math.log(segundos / self.MINIMO_S) / math.log(self.RAZAO)) + 1 if segundos > self.MINIMO_S else 0
+        self.contagens[min(indice, self.BALDES - 1)] += 1
+        self.contagem += 1
+        self.total_s += segundos
+        if segundos > self.maximo_s:
+            self.maximo_s = segundos
+
+    def percentil(self, p):
+        """Duração (limite superior do balde) abaixo da qual estão p% dos registros."""
+        alvo = self.contagem * p / 100
+        acumulado = 0
+        for indice, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if contagem and acumulado >= alvo:
+                return min(self.MINIMO_S * self.RAZAO ** indice, self.maximo_s)
+        return self.maximo_s
+
+    def resumo(self):
+        return {
+            'contagem': self.contagem,
+            'media_s': self.total_s / self.contagem if self.contagem else 0.0,
+            'p50_s': self.percentil(50),
+            'p95_s': self.percentil(95),
+            'p99_s': self.percentil(99),
+            'max_s': self.maximo_s,
+            'total_s': self.total_s,
+        }
+
+class MedidorDesempenho:
+    """Histogramas de latência por operação, alimentados pelas funções marcadas com @medir_tempo.
+
+    Enquanto 'ativo' for falso, as funções marcadas só verificam esse
+    atributo e chamam a original.
+    """
+
+    COLUNAS_CSV = ('operacao', 'contagem', 'media_s', 'p50_s', 'p95_s', 'p99_s', 'max_s', 'total_s')
+
+    def __init__(self, ativo=False):
+        self.ativo = ativo
+        self._histogramas = {}
+        self._trava = threading.Lock() # Também registram operações da thread de gravação e do servidor
+        self._exportacao = None
+
+    def registrar(self, operacao, segundos):
+        with self._trava:
+            histograma = self._histogramas.get(operacao)
+            if histograma is None:
+                histograma = self._histogramas[operacao] = HistogramaLatencia()
+            histograma.registrar(segundos)
+
+    def resumo(self):
+        """Retorna {operação: resumo do histograma}, em ordem alfabética."""
+        with self._trava:
+            return {operacao: self._histogramas[operacao].resumo() for operacao in sorted(self._histogramas)}
+
+    def zerar(self):
+        with self._trava:
+            self._histogramas.clear()
+
+    def exportar(self, caminho):
+        """Grava o resumo em JSON ou, se o arquivo terminar em .csv, em CSV (substituindo o arquivo de uma vez)."""
+        resumo = self.resumo()
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8', newline='') as f:
+            if caminho.lower().endswith('.csv'):
+                escritor = csv.writer(f, delimiter=CSV_DELIMITADOR)
+                escritor.writerow(self.COLUNAS_CSV)
+                escritor.writerows([operacao] + [valores[coluna] for coluna in self.COLUNAS_CSV[1:]] for operacao, valores in resumo.items())
+            else:
+                json.dump({'data_hora': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'operacoes': resumo}, f, indent=2, ensure_ascii=False)
+        os.replace(temporario, caminho)
+
+    def exportar_periodicamente(self, caminho, intervalo_s=DESEMPENHO_EXPORTAR_A_CADA_S):
+        """Regrava 'caminho' a cada 'intervalo_s' segundos em uma thread separada, e uma última vez ao sair."""
+        if self._exportacao is not None:
+            return
+        self._exportacao = parar = threading.Event()
+
+        def exportar():
+            try:
+                self.exportar(caminho)
+            except OSError as e:
+                print(f"Erro ao exportar o desempenho para {caminho}: {e}", file=sys.stderr)
+
+        def executar():
+            while not parar.wait(intervalo_s):
+                exportar()
+        threading.Thread(target=executar, name="exportar-desempenho", daemon=True).start()
+        atexit.register(lambda: (parar.set(), exportar()))
+
+medidor_desempenho = MedidorDesempenho(MEDIR_DESEMPENHO)
+
+def medir_tempo(funcao):
+    """Decorador: registra a duração de cada chamada no medidor_desempenho, com o nome qualificado da função."""
+    operacao = funcao.__qualname__
+
+    @functools.wraps(funcao)
+    def medida(*args, **kwargs):
+        if not medidor_desempenho.ativo:
+            return funcao(*args, **kwargs)
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            medidor_desempenho.registrar(operacao, time.perf_counter() - inicio)
+    return medida
+
+class Cronometro:
+    """Bloco 'with' medido como a operação 'nome' (para medir só parte de uma função)."""
+
+    __slots__ = ('nome', 'inicio')
+
+    def __init__(self, nome):
+        self.nome = nome
+
+    def __enter__(self):
+        self.inicio = time.perf_counter() if medidor_desempenho.ativo else None
+
+    def __exit__(self, *excecao):
+        if self.inicio is not None:
+            medidor_desempenho.registrar(self.nome, time.perf_counter() - self.inicio)
 
 # --- Funções de Persistência de Dados ---
+class ErroArmazenamento(OSError):
+    """Falha do armazenamento que não vem de um arquivo (por exemplo, banco de dados travado).
+
+    É um OSError para ser tratada onde já se tratam as falhas de gravação
+    dos arquivos JSON.
+    """
+
+@medir_tempo
 def carregar_dados(filepath):
     """Carrega dados de um arquivo JSON."""
+    dados = []
     if os.path.exists(filepath):
         try:
             with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                dados = json.load(f)
         except json.JSONDecodeError:
             messagebox.showwarning("Erro de Carregamento", f"O arquivo {filepath} está corrompido. Criando um novo.")
-            return []
-    return []
+            dados = []
+    return dados
 
+@medir_tempo
 def salvar_dados(data, filepath):
-    """Salva dados em um arquivo JSON."""
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    """Salva dados em um arquivo JSON.
+
+    Grava em um temporário, faz fsync e o renomeia sobre o original, de modo
+    que o arquivo nunca fica pela metade, mesmo se o programa cair no meio.
+    """
+    temporario = filepath + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False, default=_para_json)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, filepath)
+
+class GravadorSegundoPlano:
+    """Thread que grava arquivos JSON fora da thread da interface.
+
+    'agendar' recebe um retrato dos dados e guarda apenas o mais recente de
+    cada arquivo: se vários salvamentos chegam enquanto uma gravação está em
+    andamento, só o último estado é gravado. 'esperar' bloqueia até que tudo
+    o que foi agendado esteja em disco. Dados cuja gravação falhou são
+    guardados e gravados de novo no próximo 'esperar' (ou substituídos por
+    um agendamento mais recente do mesmo arquivo).
+    """
+
+    def __init__(self):
+        self._pendentes = {}  # arquivo -> dados mais recentes ainda não gravados
+        self._falhas = {}     # arquivo -> dados cuja gravação falhou, regravados no próximo 'esperar'
+        self._gravando = 0
+        self._erro = None
+        self._condicao = threading.Condition()
+        threading.Thread(target=self._executar, name="gravador-json", daemon=True).start()
+
+    def agendar(self, data, filepath):
+        """Agenda a gravação de 'data' (que não deve mais ser alterado por quem chamou) em 'filepath'."""
+        with self._condicao:
+            self._pendentes[filepath] = data
+            self._falhas.pop(filepath, None)
+            self._condicao.notify_all()
+
+    def esperar(self):
+        """Aguarda o fim das gravações agendadas, tentando de novo as que falharam; levanta o erro da última que falhou, se houver."""
+        with self._condicao:
+            for filepath, data in self._falhas.items():
+                self._pendentes.setdefault(filepath, data)
+            self._falhas.clear()
+            self._erro = None # Só vale o erro das gravações feitas a partir daqui, inclusive as repetidas
+            self._condicao.notify_all()
+            while self._pendentes or self._gravando:
+                self._condicao.wait()
+            erro, self._erro = self._erro, None
+        if erro is not None:
+            raise erro
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                while not self._pendentes:
+                    self._condicao.wait()
+                filepath = next(iter(self._pendentes))
+                data = self._pendentes.pop(filepath)
+                self._gravando += 1
+            try:
+                salvar_dados(data, filepath)
+            except OSError as e:
+                print(f"Erro ao gravar {filepath}: {e}", file=sys.stderr)
+                with self._condicao:
+                    self._erro = e
+                    if filepath not in self._pendentes: # Sem versão mais nova na fila, guarda estes dados para a próxima tentativa
+                        self._falhas[filepath] = data
+            finally:
+                with self._condicao:
+                    self._gravando -= 1
+                    self._condicao.notify_all()
+
+gravador_json = GravadorSegundoPlano()
+
+@medir_tempo
+def carregar_produtos_snapshot(filepath):
+    """Carrega os produtos do snapshot binário de 'filepath', regenerando-o a partir do JSON se estiver desatualizado.
+
+    O snapshot ('<arquivo>.snapshot', no formato marshal) guarda no cabeçalho o
+    tamanho e a data de modificação do JSON de onde veio; qualquer alteração
+    no JSON (ou outra versão do Python) invalida o snapshot.
+    """
+    try:
+        cabecalho_esperado = _cabecalho_snapshot(filepath)
+    except FileNotFoundError:
+        return []
+    try:
+        with open(filepath + '.snapshot', 'rb') as f:
+            cabecalho, dados = marshal.loads(f.read()) # loads sobre os bytes é bem mais rápido que marshal.load no arquivo
+        if cabecalho == cabecalho_esperado:
+            return dados
+    except (OSError, EOFError, ValueError, TypeError):
+        pass # Snapshot ausente ou ilegível: volta ao JSON
+    dados = carregar_dados(filepath)
+    salvar_produtos_snapshot(dados, filepath)
+    return dados
+
+@medir_tempo
+def salvar_produtos_snapshot(data, filepath):
+    """Grava o snapshot binário dos produtos, que devem corresponder ao conteúdo atual de 'filepath'."""
+    try:
+        cabecalho = _cabecalho_snapshot(filepath)
+        temporario = filepath + '.snapshot.tmp'
+        with open(temporario, 'wb') as f:
+            f.write(marshal.dumps((cabecalho, data)))
+        os.replace(temporario, filepath + '.snapshot')
+    except (OSError, ValueError):
+        pass # O snapshot é só um atalho; sem ele a carga lê o JSON
+
+def _cabecalho_snapshot(filepath):
+    estado = os.stat(filepath)
+    return (marshal.version, tuple(sys.version_info[:2]), estado.st_mtime_ns, estado.st_size)
+
+def _mesclar_pendentes(base, compactando):
+    """Acrescenta a 'base' as vendas de um journal em compactação no formato antigo (arquivo único de vendas).
+
+    O arquivo '<compactando>.base' guarda quantas vendas o arquivo principal
+    tinha antes da incorporação; se o tamanho mudou, a gravação já aconteceu.
+    """
+    pendentes = JournalVendas.ler(compactando)
+    if pendentes:
+        try:
+            with open(compactando + '.base', 'r', encoding='utf-8') as f:
+                tamanho_base = int(f.read())
+        except (OSError, ValueError):
+            tamanho_base = None # Interrompida antes de gravar o tamanho: nada foi incorporado
+        if tamanho_base is None or len(base) == tamanho_base:
+            base.extend(pendentes)
+    return base
+
+class JournalVendas:
+    """Registro append-only das vendas: uma linha JSON compacta por venda.
+
+    A compactação renomeia o journal atual para '<journal>.compactando' (novas
+    vendas passam a ir para um journal vazio), incorpora essas linhas às
+    partições mensais de vendas com gravações atômicas e só então remove o
+    arquivo renomeado. Se ela for interrompida, a leitura das partições e a
+    próxima compactação usam os tamanhos anotados em
+    '<journal>.compactando.base' para não duplicar as vendas já incorporadas.
+    """
+
+    def __init__(self, caminho, particoes, fsync_a_cada=JOURNAL_FSYNC_A_CADA, compactar_apos=JOURNAL_COMPACTAR_APOS):
+        self.caminho = caminho
+        self.particoes = particoes
+        self.fsync_a_cada = fsync_a_cada
+        self.compactar_apos = compactar_apos
+        self._arquivo = None
+        self._sem_fsync = 0
+        self._linhas = self._contar_linhas(caminho) if compactar_apos else 0
+        self._compactar_com = compactar_apos # Linhas que disparam a próxima compactação (sobe depois de uma falha)
+        self.registradas = 0 # Vendas registradas desde a abertura: marca até onde uma leitura chegou
+        self._lock = threading.Lock()
+        self._lock_compactacao = threading.Lock()
+
+    @staticmethod
+    def ler(caminho):
+        """Lê as vendas de um journal, ignorando uma última linha incompleta."""
+        vendas_lidas = []
+        if os.path.exists(caminho):
+            with open(caminho, 'r', encoding='utf-8') as f:
+                for linha in f:
+                    try:
+                        vendas_lidas.append(json.loads(linha))
+                    except json.JSONDecodeError:
+                        break # Escrita interrompida por uma queda; o restante não é confiável
+        return vendas_lidas
+
+    @staticmethod
+    def _contar_linhas(caminho):
+        if not os.path.exists(caminho):
+            return 0
+        with open(caminho, 'rb') as f:
+            return sum(bloco.count(b'\n') for bloco in iter(lambda: f.read(1 << 20), b''))
+
+    def registrar(self, venda):
+        """Acrescenta uma venda ao journal."""
+        self.registrar_lote([venda])
+
+    @medir_tempo
+    def registrar_lote(self, lista_vendas):
+        """Acrescenta várias vendas ao journal com uma única escrita (e no máximo um fsync)."""
+        linhas = ''.join(json.dumps(venda, ensure_ascii=False, separators=(',', ':'), default=_para_json) + '\n'
+                         for venda in lista_vendas)
+        with self._lock:
+            if self._arquivo is None:
+                self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+            self._arquivo.write(linhas)
+            self._arquivo.flush()
+            self._sem_fsync += len(lista_vendas)
+            if self.fsync_a_cada and self._sem_fsync >= self.fsync_a_cada:
+                os.fsync(self._arquivo.fileno())
+                self._sem_fsync = 0
+            self._linhas += len(lista_vendas)
+            self.registradas += len(lista_vendas)
+            compactar = self.compactar_apos and self._linhas >= self._compactar_com
+        if compactar:
+            self.compactar_em_segundo_plano()
+
+    def sincronizar(self):
+        """Força a gravação em disco das vendas ainda não sincronizadas."""
+        with self._lock:
+            self._sincronizar()
+
+    def fechar(self):
+        """Sincroniza e fecha o arquivo do journal."""
+        with self._lock:
+            self._fechar()
+
+    def _sincronizar(self):
+        if self._arquivo is not None and self._sem_fsync:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._sem_fsync = 0
+
+    def _fechar(self):
+        self._sincronizar()
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+    @medir_tempo
+    def compactar(self):
+        """Incorpora o journal às partições de vendas, o esvazia e arquiva as partições antigas."""
+        with self._lock_compactacao:
+            compactando = self.caminho + '.compactando'
+            if os.path.exists(compactando):
+                self.particoes.incorporar(compactando) # Termina uma compactação interrompida anteriormente
+            elif os.path.exists(compactando + '.base'):
+                os.remove(compactando + '.base') # Sobra de uma compactação que já havia terminado
+            with self._lock:
+                self._fechar()
+                existe = os.path.exists(self.caminho)
+                if existe:
+                    os.replace(self.caminho, compactando)
+                    self._linhas = 0
+                    self._compactar_com = self.compactar_apos
+            if existe:
+                self.particoes.incorporar(compactando)
+            self.particoes.arquivar()
+
+    def ler_vendas(self, data_inicio=None, data_fim=None):
+        """Vendas do período nas partições e no journal, lidas sem se intercalar com uma compactação."""
+        return self.ler_vendas_marcadas(data_inicio, data_fim)[0]
+
+    def ler_vendas_marcadas(self, data_inicio=None, data_fim=None):
+        """Como 'ler_vendas', retornando também 'registradas' no momento da leitura; pode ser chamada de outra thread."""
+        with self._lock_compactacao:
+            vendas_periodo = self.particoes.carregar(data_inicio, data_fim, compactando=self.caminho + '.compactando')
+            with self._lock: # O journal e a contagem são lidos sem se intercalar com um registro
+                vendas_periodo.extend(self.particoes.filtrar(self.ler(self.caminho), data_inicio, data_fim))
+                return vendas_periodo, self.registradas
+
+    def compactar_em_segundo_plano(self):
+        """Inicia a compactação em uma thread, se nenhuma estiver em andamento."""
+        if self._lock_compactacao.locked():
+            return
+        threading.Thread(target=self._compactar_em_segundo_plano, name="compactacao-vendas").start()
 
-# Carrega os dados ao iniciar o programa
-produtos = carregar_dados(PRODUTOS_FILE)
-vendas = carregar_dados(VENDAS_FILE)
+    def _compactar_em_segundo_plano(self):
+        try:
+            self.compactar()
+        except Exception as e: # As vendas continuam seguras no journal; só a compactação fica para depois
+            print(f"Erro ao compactar o journal de vendas: {e}", file=sys.stderr)
+            with self._lock:
+                self._compactar_com = self._linhas + self.compactar_apos # Nova tentativa só após mais compactar_apos vendas
+
+class VendasParticionadas:
+    """Vendas gravadas em uma partição (arquivo JSON) por mês: '<diretório>/AAAA-MM.json'.
+
+    As partições dos meses anteriores aos VENDAS_ARQUIVAR_APOS_MESES mais
+    recentes são comprimidas ('AAAA-MM.json.gz'); se existirem as duas formas
+    de um mês, vale a comprimida. Uma leitura por período abre apenas as
+    partições dos meses que o período cobre, então o relatório de hoje não
+    depende do tamanho do histórico.
+    """
+
+    MES = re.compile(r'\d{4}-\d{2}')
+
+    def __init__(self, diretorio, arquivar_apos_meses=VENDAS_ARQUIVAR_APOS_MESES):
+        self.diretorio = diretorio
+        self.arquivar_apos_meses = arquivar_apos_meses
+        self._abertas = {} # mês -> vendas agendadas para gravação em segundo plano (o arquivo pode estar atrasado)
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, mes, comprimido=False):
+        return os.path.join(self.diretorio, f"{mes}.json.gz" if comprimido else f"{mes}.json")
+
+    def meses(self):
+        """Meses que têm partição, em ordem."""
+        meses = set(self._abertas)
+        for nome in os.listdir(self.diretorio):
+            mes = nome[:7]
+            if self.MES.fullmatch(mes) and nome in (f"{mes}.json", f"{mes}.json.gz"):
+                meses.add(mes)
+        return sorted(meses)
+
+    def _arquivavel(self, mes):
+        if self.arquivar_apos_meses is None:
+            return False
+        hoje = datetime.now()
+        indice = hoje.year * 12 + hoje.month - 1 - self.arquivar_apos_meses
+        return mes < f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+    def ler_mes(self, mes):
+        """Vendas de um mês, na ordem em que foram registradas."""
+        if mes in self._abertas:
+            return list(self._abertas[mes])
+        comprimido = self._caminho(mes, comprimido=True)
+        if os.path.exists(comprimido):
+            with gzip.open(comprimido, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        return carregar_dados(self._caminho(mes))
+
+    def gravar_mes(self, mes, vendas_mes, em_segundo_plano=False):
+        """Regrava a partição de um mês; meses arquivados (ou antigos o bastante) são gravados comprimidos."""
+        if os.path.exists(self._caminho(mes, comprimido=True)) or self._arquivavel(mes):
+            self._abertas.pop(mes, None)
+            self._gravar_comprimido(vendas_mes, self._caminho(mes, comprimido=True))
+        elif em_segundo_plano:
+            self._abertas[mes] = vendas_mes
+            gravador_json.agendar(vendas_mes, self._caminho(mes))
+        else:
+            self._abertas.pop(mes, None)
+            salvar_dados(vendas_mes, self._caminho(mes))
+
+    @staticmethod
+    def _gravar_comprimido(lista_vendas, caminho):
+        temporario = caminho + '.tmp'
+        with open(temporario, 'wb') as bruto:
+            with gzip.GzipFile(fileobj=bruto, mode='wb') as f:
+                f.write(json.dumps(lista_vendas, ensure_ascii=False, separators=(',', ':'), default=_para_json).encode('utf-8'))
+            bruto.flush()
+            os.fsync(bruto.fileno())
+        os.replace(temporario, caminho)
+
+    @staticmethod
+    def _por_mes(lista_vendas):
+        por_mes = {}
+        for venda in lista_vendas:
+            por_mes.setdefault(venda['data_hora'][:7], []).append(venda)
+        return por_mes
+
+    @staticmethod
+    def filtrar(lista_vendas, data_inicio, data_fim):
+        """Vendas da lista que caem no período (datas 'AAAA-MM-DD', inclusivas; vazias ou None para sem limite)."""
+        if not data_inicio and not data_fim:
+            return lista_vendas
+        return [venda for venda in lista_vendas
+                if (not data_inicio or venda['data_hora'][:10] >= data_inicio) and (not data_fim or venda['data_hora'][:10] <= data_fim)]
+
+    def acrescentar(self, novas_vendas, em_segundo_plano=False):
+        """Acrescenta vendas às partições dos seus meses (normalmente, só a do mês atual é regravada)."""
+        for mes, vendas_mes in self._por_mes(novas_vendas).items():
+            self.gravar_mes(mes, self.ler_mes(mes) + vendas_mes, em_segundo_plano)
+
+    def carregar(self, data_inicio=None, data_fim=None, compactando=None):
+        """Vendas do período (datas 'AAAA-MM-DD', inclusivas), abrindo só as partições dos meses do período.
+
+        Se 'compactando' for informado, inclui as vendas do journal em
+        compactação que as partições ainda não receberam.
+        """
+        pendentes, tamanhos = self._pendentes(compactando) if compactando else ({}, None)
+        vendas_periodo = []
+        for mes in sorted(set(self.meses()) | set(pendentes)):
+            if (data_inicio and mes < data_inicio[:7]) or (data_fim and mes > data_fim[:7]):
+                continue # Partição fora do período: nem é aberta
+            vendas_mes = self._mesclar(mes, self.ler_mes(mes), pendentes, tamanhos)
+            vendas_periodo.extend(self.filtrar(vendas_mes, data_inicio, data_fim))
+        return vendas_periodo
+
+    def _pendentes(self, compactando):
+        """Vendas de um journal em compactação, por mês, e os tamanhos das partições anotados antes de gravá-las (ou None)."""
+        pendentes = self._por_mes(JournalVendas.ler(compactando))
+        try:
+            with open(compactando + '.base', 'r', encoding='utf-8') as f:
+                tamanhos = json.load(f)
+        except (OSError, ValueError):
+            tamanhos = None # Interrompida antes de anotar os tamanhos: nenhuma partição foi gravada
+        return pendentes, tamanhos if isinstance(tamanhos, dict) else None
+
+    @staticmethod
+    def _mesclar(mes, vendas_mes, pendentes, tamanhos):
+        """Acrescenta a 'vendas_mes' as vendas pendentes do mês, se a partição ainda não as recebeu."""
+        if mes in pendentes and (tamanhos is None or len(vendas_mes) == tamanhos.get(mes, 0)):
+            return vendas_mes + pendentes[mes]
+        return vendas_mes
+
+    def incorporar(self, compactando):
+        """Grava nas partições as vendas de um journal em compactação e remove o journal."""
+        pendentes, tamanhos = self._pendentes(compactando)
+        atuais = {mes: self.ler_mes(mes) for mes in pendentes}
+        marcador = compactando + '.base'
+        if tamanhos is None: # Se já existe, é de uma tentativa anterior e valem os tamanhos anotados nela
+            tamanhos = {mes: len(vendas_mes) for mes, vendas_mes in atuais.items()}
+            with open(marcador, 'w', encoding='utf-8') as f:
+                json.dump(tamanhos, f)
+                f.flush()
+                os.fsync(f.fileno())
+        for mes, vendas_mes in atuais.items():
+            self.gravar_mes(mes, self._mesclar(mes, vendas_mes, pendentes, tamanhos))
+        os.remove(compactando)
+        os.remove(marcador)
+
+    @medir_tempo
+    def arquivar(self):
+        """Comprime as partições dos meses antigos. Retorna quantas foram comprimidas."""
+        arquivadas = 0
+        for mes in self.meses():
+            caminho = self._caminho(mes)
+            if not self._arquivavel(mes):
+                break # Os meses estão em ordem: daqui em diante, todos são recentes
+            if not os.path.exists(caminho):
+                continue
+            if not os.path.exists(self._caminho(mes, comprimido=True)):
+                self._gravar_comprimido(self.ler_mes(mes), self._caminho(mes, comprimido=True))
+                arquivadas += 1
+            os.remove(caminho) # Se a comprimida já existia, esta é sobra de um arquivamento interrompido
+            self._abertas.pop(mes, None)
+        return arquivadas
+
+    def migrar_arquivo_unico(self, vendas_file, compactando):
+        """Distribui pelas partições as vendas do arquivo único das versões anteriores e o remove.
+
+        Uma compactação do journal interrompida no formato antigo é concluída
+        antes, sobre o próprio arquivo único. Se a migração for interrompida,
+        ela é refeita do início na próxima abertura.
+        """
+        lista_vendas = carregar_dados(vendas_file)
+        if os.path.exists(compactando):
+            marcador = compactando + '.base'
+            if not os.path.exists(marcador):
+                with open(marcador, 'w', encoding='utf-8') as f:
+                    f.write(str(len(lista_vendas)))
+                    f.flush()
+                    os.fsync(f.fileno())
+            salvar_dados(_mesclar_pendentes(lista_vendas, compactando), vendas_file)
+            os.remove(compactando)
+            os.remove(marcador)
+        for mes, vendas_mes in self._por_mes(lista_vendas).items():
+            self.gravar_mes(mes, vendas_mes)
+        os.remove(vendas_file)
+        return len(lista_vendas)
+
+# --- Registros Compactos ---
+# Produtos e vendas carregados ficam em objetos com __slots__ em vez de dicionários,
+# com códigos e nomes internados (cada texto repetido existe uma vez só na memória).
+# Eles aceitam o mesmo acesso por chave dos dicionários que substituem.
+
+class RegistroCompacto:
+    """Base dos registros compactos: acesso por chave, como em um dicionário.
+
+    Campos com valor None são tratados como ausentes (como uma chave que não
+    existe no dicionário original).
+    """
+    __slots__ = ()
+
+    def __getitem__(self, chave):
+        valor = getattr(self, chave, None) if chave in self.__slots__ else None
+        if valor is None:
+            raise KeyError(chave)
+        return valor
+
+    def __setitem__(self, chave, valor):
+        if chave not in self.__slots__:
+            raise KeyError(chave)
+        setattr(self, chave, valor)
+
+    def get(self, chave, padrao=None):
+        valor = getattr(self, chave, None) if chave in self.__slots__ else None
+        return padrao if valor is None else valor
+
+    def __contains__(self, chave):
+        return chave in self.__slots__ and getattr(self, chave) is not None
+
+    def keys(self):
+        return [chave for chave in self.__slots__ if getattr(self, chave) is not None]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.como_dict()!r})"
+
+    def items(self):
+        return [(chave, self[chave]) for chave in self.keys()]
+
+    def como_dict(self):
+        """Retorna o registro como dicionário (formato dos arquivos JSON)."""
+        return {chave: self[chave] for chave in self.keys()}
+
+class Produto(RegistroCompacto):
+    __slots__ = ('codigo', 'nome', 'preco', 'estoque', 'estoque_minimo')
+
+    def __init__(self, codigo, nome, preco, estoque, estoque_minimo=None):
+        self.codigo = sys.intern(codigo)
+        self.nome = sys.intern(nome)
+        self.preco = preco
+        self.estoque = estoque
+        self.estoque_minimo = estoque_minimo
+
+    @classmethod
+    def de_dict(cls, dados):
+        return cls(dados['codigo'], dados['nome'], dados['preco'], dados['estoque'], dados.get('estoque_minimo'))
+
+class ItemVenda(RegistroCompacto):
+    __slots__ = ('codigo', 'nome', 'quantidade', 'preco_unitario', 'subtotal')
+
+    def __init__(self, codigo, nome, quantidade, preco_unitario, subtotal):
+        self.codigo = sys.intern(codigo)
+        self.nome = sys.intern(nome)
+        self.quantidade = quantidade
+        self.preco_unitario = preco_unitario
+        self.subtotal = subtotal
+
+class Venda(RegistroCompacto):
+    __slots__ = ('data_hora', 'itens', 'total')
+
+    def __init__(self, data_hora, itens, total):
+        self.data_hora = data_hora
+        self.itens = itens
+        self.total = total
+
+    @classmethod
+    def de_dict(cls, dados):
+        itens = tuple(ItemVenda(i['codigo'], i['nome'], i['quantidade'], i['preco_unitario'], i['subtotal']) for i in dados['itens'])
+        return cls(dados['data_hora'], itens, dados['total'])
+
+    def como_dict(self):
+        return {'data_hora': self.data_hora, 'itens': [item.como_dict() for item in self.itens], 'total': self.total}
+
+class RetratoRegistros:
+    """Cópia imutável dos campos de uma lista de registros compactos (uma tupla por registro).
+
+    Tirar o retrato é barato (não cria dicionários); a conversão para o formato JSON fica
+    para quem grava, por exemplo a thread de gravação em segundo plano."""
+    __slots__ = ('campos', 'valores')
+
+    def __init__(self, registros, campos):
+        self.campos = campos
+        self.valores = tuple(map(operator.attrgetter(*campos), registros))
+
+    def como_lista(self):
+        campos = self.campos
+        return [{chave: valor for chave, valor in zip(campos, linha) if valor is not None} for linha in self.valores]
+
+def _para_json(objeto):
+    """Permite gravar registros compactos com json.dump (parâmetro 'default')."""
+    if isinstance(objeto, RegistroCompacto):
+        return objeto.como_dict()
+    if isinstance(objeto, RetratoRegistros):
+        return objeto.como_lista()
+    raise TypeError(f"Objeto do tipo {type(objeto).__name__} não é serializável em JSON")
+
+def uso_memoria(objetos):
+    """Estima, em bytes, a memória ocupada por 'objetos' e tudo o que eles referenciam (sem contar duas vezes)."""
+    vistos = set()
+    total = 0
+    pilha = [objetos]
+    while pilha:
+        objeto = pilha.pop()
+        if id(objeto) in vistos:
+            continue
+        vistos.add(id(objeto))
+        total += sys.getsizeof(objeto)
+        if isinstance(objeto, dict):
+            pilha.extend(objeto.keys())
+            pilha.extend(objeto.values())
+        elif isinstance(objeto, (list, tuple, set)):
+            pilha.extend(objeto)
+        elif isinstance(objeto, RegistroCompacto):
+            pilha.extend(getattr(objeto, chave) for chave in objeto.__slots__)
+    return total
+
+# --- Catálogo de Produtos ---
+
+def normalizar_codigo(codigo):
+    """Normaliza um código de produto para uso como chave de busca."""
+    return codigo.strip().upper()
+
+class IndiceEstoque:
+    """Índice dos produtos por nível de estoque.
+
+    Agrupa os códigos em baldes por quantidade em estoque e mantém a lista
+    ordenada dos níveis existentes, de modo que "todos os produtos com
+    estoque <= N" custa O(k + log n), sem percorrer o catálogo.
+    """
+
+    def __init__(self):
+        self._niveis = []     # Níveis de estoque distintos, em ordem crescente
+        self._por_nivel = {}  # nível -> {código: None} (dicionário usado como conjunto ordenado)
+
+    def inserir(self, codigo, estoque):
+        balde = self._por_nivel.get(estoque)
+        if balde is None:
+            balde = self._por_nivel[estoque] = {}
+            bisect.insort(self._niveis, estoque)
+        balde[codigo] = None
+
+    def remover(self, codigo, estoque):
+        balde = self._por_nivel[estoque]
+        del balde[codigo]
+        if not balde:
+            del self._por_nivel[estoque]
+            del self._niveis[bisect.bisect_left(self._niveis, estoque)]
+
+    def mover(self, codigo, estoque_anterior, estoque_novo):
+        if estoque_anterior != estoque_novo:
+            self.remover(codigo, estoque_anterior)
+            self.inserir(codigo, estoque_novo)
+
+    def codigos_ate(self, limite):
+        """Gera os códigos com estoque <= limite, do menor para o maior estoque."""
+        for nivel in self._niveis[:bisect.bisect_right(self._niveis, limite)]:
+            yield from self._por_nivel[nivel]
+
+# --- Busca por Nome ---
+
+_PALAVRA = re.compile(r'[a-z0-9]+')
+
+def palavras_nome(texto):
+    """Divide um nome em palavras minúsculas e sem acentos ("Feijão 1Kg" -> ['feijao', '1kg'])."""
+    texto = texto.lower()
+    if not texto.isascii():
+        texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return _PALAVRA.findall(texto)
+
+def _trigramas(palavra):
+    palavra = f" {palavra} "
+    return {palavra[i:i + 3] for i in range(len(palavra) - 2)}
+
+def _distancia_edicao(a, b, limite):
+    """Distância de Levenshtein entre 'a' e 'b', ou limite + 1 se ela passar do limite."""
+    if abs(len(a) - len(b)) > limite:
+        return limite + 1
+    anterior = list(range(len(b) + 1))
+    for i, letra_a in enumerate(a, 1):
+        atual = [i]
+        for j, letra_b in enumerate(b, 1):
+            atual.append(min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + (letra_a != letra_b)))
+        if min(atual) > limite:
+            return limite + 1
+        anterior = atual
+    return anterior[-1]
+
+class IndiceNomes:
+    """Índice invertido das palavras dos nomes dos produtos.
+
+    Cada palavra aponta para os códigos que a contêm. A lista ordenada das
+    palavras permite achar por bisect todas as que começam com um termo
+    digitado, e um índice de trigramas das palavras encontra as parecidas
+    com um termo digitado com erro, sem comparar o texto com o catálogo
+    inteiro. Um produto corresponde ao texto quando cada termo do texto
+    casa com alguma palavra do seu nome.
+    """
+
+    def __init__(self, pares=()):
+        self._codigos_por_palavra = {}   # palavra -> {código: None}
+        self._palavras_por_codigo = {}   # código -> palavras do nome
+        self._palavras_por_trigrama = {} # trigrama -> {palavras}
+        for codigo, nome in pares:
+            self._indexar(codigo, nome)
+        # Na construção, a lista ordenada e os trigramas são montados uma única vez, depois de conhecidas todas as palavras
+        self._palavras = sorted(self._codigos_por_palavra)
+        for palavra in self._palavras:
+            self._indexar_trigramas(palavra)
+
+    def _indexar(self, codigo, nome):
+        """Indexa o nome de um código e retorna as palavras que ainda não existiam no índice."""
+        palavras = tuple(dict.fromkeys(map(sys.intern, palavras_nome(nome))))
+        self._palavras_por_codigo[codigo] = palavras
+        novas = []
+        for palavra in palavras:
+            codigos = self._codigos_por_palavra.get(palavra)
+            if codigos is None:
+                self._codigos_por_palavra[palavra] = {codigo: None}
+                novas.append(palavra)
+            else:
+                codigos[codigo] = None
+        return novas
+
+    def _indexar_trigramas(self, palavra):
+        for trigrama in _trigramas(palavra):
+            palavras = self._palavras_por_trigrama.get(trigrama)
+            if palavras is None:
+                self._palavras_por_trigrama[trigrama] = {palavra}
+            else:
+                palavras.add(palavra)
+
+    def inserir(self, codigo, nome):
+        """Indexa (ou reindexa) o nome de um código."""
+        self.remover(codigo)
+        for palavra in self._indexar(codigo, nome):
+            bisect.insort(self._palavras, palavra)
+            self._indexar_trigramas(palavra)
+
+    def remover(self, codigo):
+        for palavra in self._palavras_por_codigo.pop(codigo, ()):
+            codigos = self._codigos_por_palavra[palavra]
+            del codigos[codigo]
+            if not codigos:
+                del self._codigos_por_palavra[palavra]
+                del self._palavras[bisect.bisect_left(self._palavras, palavra)]
+                for trigrama in _trigramas(palavra):
+                    palavras = self._palavras_por_trigrama[trigrama]
+                    palavras.discard(palavra)
+                    if not palavras:
+                        del self._palavras_por_trigrama[trigrama]
+
+    def _palavras_com_prefixo(self, prefixo):
+        fim = len(self._palavras)
+        i = bisect.bisect_left(self._palavras, prefixo)
+        while i < fim and self._palavras[i].startswith(prefixo):
+            yield self._palavras[i]
+            i += 1
+
+    def _palavras_parecidas(self, termo):
+        """Palavras a até 1 (termos de 3 a 5 letras) ou 2 edições do termo, inteiras ou no seu início."""
+        if len(termo) < 3:
+            return []
+        limite = 1 if len(termo) <= 5 else 2
+        trigramas_comuns = {}
+        for trigrama in _trigramas(termo):
+            for palavra in self._palavras_por_trigrama.get(trigrama, ()):
+                trigramas_comuns[palavra] = trigramas_comuns.get(palavra, 0) + 1
+        candidatas = heapq.nlargest(BUSCA_CANDIDATOS_APROXIMADOS, trigramas_comuns, key=trigramas_comuns.get)
+        # Comparar também com o início da palavra tolera erros em uma palavra ainda sendo digitada
+        return [palavra for palavra in candidatas
+                if min(_distancia_edicao(termo, palavra, limite), _distancia_edicao(termo, palavra[:len(termo)], limite)) <= limite]
+
+    def _coletar(self, opcoes, resultados, limite):
+        """Acrescenta a 'resultados' os códigos cujo nome casa com uma das opções de cada termo."""
+        # Percorre os códigos do termo mais seletivo e confere os demais termos nas palavras de cada código
+        totais = [sum(len(self._codigos_por_palavra[palavra]) for palavra in palavras) for palavras in opcoes]
+        guia = totais.index(min(totais))
+        demais = opcoes[:guia] + opcoes[guia + 1:]
+        for palavra in sorted(opcoes[guia]):
+            for codigo in self._codigos_por_palavra[palavra]:
+                if codigo in resultados:
+                    continue
+                palavras_codigo = self._palavras_por_codigo[codigo]
+                if all(not palavras.isdisjoint(palavras_codigo) for palavras in demais):
+                    resultados[codigo] = None
+                    if len(resultados) >= limite:
+                        return
+
+    def buscar(self, texto, limite=AUTOCOMPLETAR_LIMITE):
+        """Retorna até 'limite' códigos cujo nome tem palavras começando com cada termo do texto.
+
+        Se não houver resultados suficientes, completa com os nomes em que
+        os termos aparecem com erros de digitação: primeiro aceitando erros
+        só nos termos que não são início de nenhuma palavra, depois em todos.
+        """
+        termos = palavras_nome(texto)
+        if not termos or limite <= 0:
+            return []
+        resultados = {}
+        opcoes = [set(self._palavras_com_prefixo(termo)) for termo in termos]
+        if all(opcoes):
+            self._coletar(opcoes, resultados, limite)
+        for aproximar_todos in (False, True):
+            if len(resultados) >= limite:
+                break
+            ampliadas = [palavras.union(self._palavras_parecidas(termo)) if aproximar_todos or not palavras else palavras
+                         for termo, palavras in zip(termos, opcoes)]
+            if ampliadas != opcoes and all(ampliadas):
+                self._coletar(ampliadas, resultados, limite)
+            opcoes = ampliadas
+        return list(resultados)
+
+class CatalogoProdutos:
+    """Catálogo de produtos indexado pelo código normalizado.
+
+    Mantém um dicionário código -> produto (que preserva a ordem de inserção),
+    de modo que busca, inclusão/atualização e exclusão custam O(1)
+    independentemente do tamanho do catálogo. Também mantém um IndiceEstoque
+    e, depois da primeira busca por nome, um IndiceNomes; por isso o estoque
+    e o nome de um produto do catálogo devem ser alterados com
+    'baixar_estoque' ou 'inserir_ou_atualizar', nunca diretamente.
+    """
+
+    def __init__(self, lista_produtos=None):
+        self._por_codigo = {}
+        self.indice_estoque = IndiceEstoque()
+        self._indice_nomes = None # Construído na primeira busca por nome, para não atrasar a inicialização
+        self._construcao_nomes = None # Construção do índice de nomes em segundo plano em andamento (ver iniciar_indice_nomes)
+        self._nomes_alterados = None  # código -> nome (None se removido) alterados durante essa construção
+        for produto in lista_produtos or []:
+            # Em caso de códigos duplicados no arquivo, prevalece o primeiro (como na busca linear antiga)
+            chave = sys.intern(normalizar_codigo(produto['codigo'])) # Compartilha o texto com o código do Produto
+            if chave not in self._por_codigo:
+                self._por_codigo[chave] = Produto.de_dict(produto)
+                self.indice_estoque.inserir(chave, produto['estoque'])
+
+    def buscar(self, codigo):
+        """Retorna o produto com o código informado ou None."""
+        return self._por_codigo.get(normalizar_codigo(codigo))
+
+    def inserir_ou_atualizar(self, produto):
+        """Insere ou substitui um produto (dicionário ou Produto). Retorna True se era uma atualização."""
+        if not isinstance(produto, Produto):
+            produto = Produto.de_dict(produto)
+        chave = sys.intern(normalizar_codigo(produto['codigo']))
+        anterior = self._por_codigo.get(chave)
+        if anterior is not None:
+            self.indice_estoque.remover(chave, anterior['estoque'])
+        self._por_codigo[chave] = produto # Atualizações mantêm a posição original
+        self.indice_estoque.inserir(chave, produto['estoque'])
+        if self._indice_nomes is not None:
+            self._indice_nomes.inserir(chave, produto['nome'])
+        elif self._nomes_alterados is not None:
+            self._nomes_alterados[chave] = produto['nome']
+        return anterior is not None
+
+    def inserir_ou_atualizar_lote(self, lista_produtos):
+        """Insere ou substitui vários produtos. Retorna os registros substituídos (None para os novos), na mesma ordem."""
+        anteriores = []
+        for produto in lista_produtos:
+            anteriores.append(self.buscar(produto['codigo']))
+            self.inserir_ou_atualizar(produto)
+        return anteriores
+
+    def remover(self, codigo):
+        """Remove um produto pelo código. Retorna True se ele existia."""
+        chave = normalizar_codigo(codigo)
+        produto = self._por_codigo.pop(chave, None)
+        if produto is None:
+            return False
+        self.indice_estoque.remover(chave, produto['estoque'])
+        if self._indice_nomes is not None:
+            self._indice_nomes.remover(chave)
+        elif self._nomes_alterados is not None:
+            self._nomes_alterados[chave] = None
+        return True
+
+    def baixar_estoque(self, produto, quantidade):
+        """Subtrai 'quantidade' do estoque do produto.
+
+        Retorna True se a baixa fez o estoque cruzar o estoque mínimo do
+        produto (passou de acima dele para igual ou abaixo).
+        """
+        anterior = produto['estoque']
+        produto['estoque'] = anterior - quantidade
+        self.indice_estoque.mover(normalizar_codigo(produto['codigo']), anterior, produto['estoque'])
+        minimo = produto.get('estoque_minimo')
+        return minimo is not None and anterior > minimo >= produto['estoque']
+
+    def definir_estoque(self, produto, estoque):
+        """Define o estoque do produto mantendo o índice de estoque (sem avisos de estoque mínimo)."""
+        self.indice_estoque.mover(normalizar_codigo(produto['codigo']), produto['estoque'], estoque)
+        produto['estoque'] = estoque
+
+    def com_estoque_ate(self, limite):
+        """Retorna os produtos com estoque <= limite, em ordem crescente de estoque."""
+        return [self._por_codigo[codigo] for codigo in self.indice_estoque.codigos_ate(limite)]
+
+    def indice_nomes(self):
+        """Retorna o índice de nomes, construindo-o na primeira chamada."""
+        if self._indice_nomes is None:
+            # Uma construção em segundo plano ainda em andamento é descartada quando terminar
+            self._construcao_nomes = self._nomes_alterados = None
+            self._indice_nomes = IndiceNomes((codigo, produto['nome']) for codigo, produto in self._por_codigo.items())
+        return self._indice_nomes
+
+    def iniciar_indice_nomes(self):
+        """Começa a construir o índice de nomes em uma thread, a partir de um retrato (código, nome) do catálogo.
+
+        Retorna a construção, a ser passada a 'concluir_indice_nomes' (na
+        thread que altera o catálogo) até que ela retorne True; retorna None
+        se o índice já existe ou já está sendo construído.
+        """
+        if self._indice_nomes is not None or self._construcao_nomes is not None:
+            return None
+        pares = [(codigo, produto.nome) for codigo, produto in self._por_codigo.items()]
+        construcao = self._construcao_nomes = [] # Recebe o índice pronto (ou None, se a construção falhar)
+        self._nomes_alterados = {}
+
+        def construir():
+            try:
+                indice = IndiceNomes(pares)
+            except Exception as e: # A busca por nome constrói o índice na primeira chamada, como antes
+                print(f"Erro ao construir o índice de nomes: {e}", file=sys.stderr)
+                indice = None
+            construcao.append(indice)
+
+        threading.Thread(target=construir, name="indice-nomes", daemon=True).start()
+        return construcao
+
+    def concluir_indice_nomes(self, construcao):
+        """Se a construção terminou, aplica nela as alterações feitas enquanto isso e passa a usá-la. Retorna True se terminou."""
+        if not construcao:
+            return False
+        if construcao is self._construcao_nomes:
+            indice = construcao[0]
+            if indice is not None:
+                for codigo, nome in self._nomes_alterados.items():
+                    if nome is None:
+                        indice.remover(codigo)
+                    else:
+                        indice.inserir(codigo, nome)
+            self._indice_nomes = indice
+            self._construcao_nomes = self._nomes_alterados = None
+        return True
+
+    def pesquisar(self, texto, limite=AUTOCOMPLETAR_LIMITE):
+        """Busca produtos pelo código exato ou pelo nome (início das palavras, tolerando erros de digitação)."""
+        exato = self.buscar(texto) if texto.strip() else None
+        encontrados = [exato] if exato is not None else []
+        for codigo in self.indice_nomes().buscar(texto, limite):
+            produto = self._por_codigo[codigo]
+            if produto is not exato and len(encontrados) < limite:
+                encontrados.append(produto)
+        return encontrados
+
+    def registros(self):
+        """Retorna a lista dos próprios registros de produto (sem copiá-los), serializável com _para_json."""
+        return list(self._por_codigo.values())
+
+    def retrato(self):
+        """Retorna um RetratoRegistros dos produtos: cópia imutável e barata, serializável com _para_json."""
+        return RetratoRegistros(self._por_codigo.values(), Produto.__slots__)
+
+    def como_lista(self):
+        """Retorna uma cópia dos produtos como lista de dicionários, no formato gravado em produtos.json."""
+        return [produto.como_dict() for produto in self._por_codigo.values()]
+
+    def uso_memoria(self):
+        """Estima a memória ocupada pelo catálogo e seus índices, em bytes."""
+        indice_nomes = vars(self._indice_nomes) if self._indice_nomes is not None else {}
+        return uso_memoria([self._por_codigo, self.indice_estoque._niveis, self.indice_estoque._por_nivel, indice_nomes])
+
+    def codigos(self):
+        """Retorna os códigos normalizados, na ordem do catálogo."""
+        return list(self._por_codigo)
+
+    def __contains__(self, codigo):
+        return normalizar_codigo(codigo) in self._por_codigo
+
+    def __iter__(self):
+        return iter(self._por_codigo.values())
+
+    def __len__(self):
+        return len(self._por_codigo)
+
+# --- Agregados de Vendas ---
+
+class AgregadosVendas:
+    """Totais de vendas mantidos incrementalmente a cada venda registrada.
+
+    Guarda o total geral, a quantidade de vendas (tickets), os totais por dia
+    e as unidades/receita por produto, de modo que os resumos não precisam
+    percorrer todos os itens já vendidos.
+    """
+
+    def __init__(self, lista_vendas=None):
+        self.total_geral = 0.0
+        self.quantidade_vendas = 0
+        self.por_dia = {}      # 'AAAA-MM-DD' -> [total, quantidade de vendas]
+        self.por_produto = {}  # código -> [nome, unidades, receita]
+        for venda in lista_vendas or []:
+            self.registrar(venda)
+
+    def registrar(self, venda):
+        """Incorpora uma venda aos totais."""
+        self.total_geral += venda['total']
+        self.quantidade_vendas += 1
+        dia = self.por_dia.setdefault(venda['data_hora'][:10], [0.0, 0])
+        dia[0] += venda['total']
+        dia[1] += 1
+        for item in venda['itens']:
+            acumulado = self.por_produto.setdefault(normalizar_codigo(item['codigo']), [item['nome'], 0, 0.0])
+            acumulado[0] = item['nome'] # Mantém o nome mais recente
+            acumulado[1] += item['quantidade']
+            acumulado[2] += item['subtotal']
+
+    def resumo(self, data_inicio=None, data_fim=None):
+        """Retorna total, quantidade de vendas e totais por dia no período (datas 'AAAA-MM-DD', inclusivas)."""
+        if data_inicio is None and data_fim is None:
+            dias = sorted(self.por_dia.items())
+            return {'total': self.total_geral, 'quantidade_vendas': self.quantidade_vendas, 'dias': dias}
+        dias = sorted((dia, valores) for dia, valores in self.por_dia.items()
+                      if (data_inicio is None or dia >= data_inicio) and (data_fim is None or dia <= data_fim))
+        return {'total': sum(v[0] for _, v in dias), 'quantidade_vendas': sum(v[1] for _, v in dias), 'dias': dias}
+
+    def produtos_mais_vendidos(self, quantidade=10):
+        """Retorna [(código, nome, unidades, receita)] dos produtos de maior receita."""
+        maiores = heapq.nlargest(quantidade, self.por_produto.items(), key=lambda par: par[1][2])
+        return [(codigo, nome, unidades, receita) for codigo, (nome, unidades, receita) in maiores]
+
+class LeituraVendas:
+    """Leitura das vendas de um período feita em uma thread (ver HistoricoVendas.iniciar_leitura).
+
+    A thread só chama 'ler' (o 'ler_vendas_marcadas' do armazenamento) e
+    converte o resultado; os lotes registrados enquanto isso são anotados
+    pela thread da interface em 'lotes', com a marca de cada um.
+    """
+
+    def __init__(self, ler, data_inicio, data_fim):
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.lotes = []       # (marca, vendas) registrados desde o início da leitura
+        self.resultado = None # (vendas, marca) lidas do armazenamento
+        self.erro = None
+        self._terminou = threading.Event()
+        threading.Thread(target=self._executar, args=(ler,), name="leitura-vendas", daemon=True).start()
+
+    @property
+    def terminou(self):
+        return self._terminou.is_set()
+
+    def _executar(self, ler):
+        try:
+            with Cronometro('LeituraVendas'):
+                vendas_lidas, marca = ler(self.data_inicio, self.data_fim)
+                self.resultado = ([Venda.de_dict(venda) for venda in vendas_lidas], marca)
+        except Exception as e: # Levantado por 'concluir_leitura', na thread da interface
+            self.erro = e
+        finally:
+            self._terminou.set()
+
+class HistoricoVendas:
+    """Histórico de vendas, carregado do armazenamento só quando alguém precisa dele.
+
+    O checkout não lê o histórico: enquanto ele não foi carregado, as novas
+    vendas vão apenas para o armazenamento, e a carga posterior já as inclui.
+    Os agregados de vendas também só são calculados na primeira consulta.
+    """
+
+    def __init__(self, carregar, ler_marcadas=None):
+        self._carregar = carregar
+        self._ler_marcadas = ler_marcadas
+        self._vendas = None
+        self._agregados = None
+        self._leituras = [] # Leituras em segundo plano em andamento, que recebem os lotes acrescentados
+
+    @property
+    def carregado(self):
+        return self._vendas is not None
+
+    @medir_tempo
+    def lista(self):
+        """Retorna a lista de vendas (registros Venda), carregando-a na primeira chamada."""
+        if self._vendas is None:
+            self._vendas = [Venda.de_dict(venda) for venda in self._carregar()]
+        return self._vendas
+
+    @medir_tempo
+    def periodo(self, data_inicio=None, data_fim=None):
+        """Retorna as vendas do período (datas 'AAAA-MM-DD', inclusivas, None para sem limite).
+
+        Com o histórico já carregado, filtra a lista em memória; senão, lê do
+        armazenamento só as vendas do período, sem carregar o histórico inteiro.
+        """
+        if data_inicio is None and data_fim is None:
+            return self.lista()
+        if self._vendas is None:
+            return [Venda.de_dict(venda) for venda in self._carregar(data_inicio, data_fim)]
+        return [venda for venda in self._vendas
+                if (data_inicio is None or venda['data_hora'][:10] >= data_inicio) and (data_fim is None or venda['data_hora'][:10] <= data_fim)]
+
+    def iniciar_leitura(self, data_inicio=None, data_fim=None):
+        """Começa a ler as vendas do período do armazenamento em uma thread, sem tocar no histórico.
+
+        Retorna a leitura; quando 'leitura.terminou', ela deve ser passada a
+        'concluir_leitura' na thread que registra as vendas.
+        """
+        leitura = LeituraVendas(self._ler_marcadas, data_inicio, data_fim)
+        self._leituras.append(leitura)
+        return leitura
+
+    def concluir_leitura(self, leitura):
+        """Retorna (tupla) as vendas lidas mais as registradas depois da leitura; levanta o erro da leitura, se houve.
+
+        Se o período é todo o histórico e ele ainda não foi carregado, as
+        vendas lidas passam a ser o histórico carregado.
+        """
+        self._leituras.remove(leitura)
+        if leitura.erro is not None:
+            raise leitura.erro
+        vendas_lidas, marca = leitura.resultado
+        for marca_lote, lote in leitura.lotes:
+            if marca_lote > marca: # Lote registrado depois de o armazenamento ser lido
+                vendas_lidas.extend(VendasParticionadas.filtrar(lote, leitura.data_inicio, leitura.data_fim))
+        if leitura.data_inicio is None and leitura.data_fim is None and self._vendas is None:
+            self._vendas = vendas_lidas
+        return tuple(vendas_lidas)
+
+    def uso_memoria(self):
+        """Estima a memória ocupada pelas vendas carregadas, em bytes (0 se ainda não foram carregadas)."""
+        return uso_memoria(self._vendas) if self._vendas is not None else 0
+
+    @medir_tempo
+    def agregados(self):
+        """Retorna os AgregadosVendas do histórico, calculando-os na primeira chamada."""
+        if self._agregados is None:
+            self._agregados = AgregadosVendas(self.lista())
+        return self._agregados
+
+    def acrescentar(self, novas_vendas, marca=None):
+        """Inclui vendas já gravadas no armazenamento ('marca' é a do lote, para as leituras em andamento)."""
+        if self._vendas is not None or self._leituras:
+            registros = [Venda.de_dict(venda) for venda in novas_vendas]
+            if self._vendas is not None:
+                self._vendas.extend(registros)
+            for leitura in self._leituras:
+                leitura.lotes.append((marca, registros))
+        if self._agregados is not None:
+            for venda in novas_vendas:
+                self._agregados.registrar(venda)
+
+# --- Camada de Armazenamento ---
+
+class ArmazenamentoJSON:
+    """Armazenamento em arquivos JSON (padrão): produtos.json, as partições mensais de vendas e o journal de vendas."""
+
+    def __init__(self, produtos_file=PRODUTOS_FILE, vendas_dir=VENDAS_PARTICOES_DIR, journal_file=VENDAS_JOURNAL_FILE,
+                 vendas_file=VENDAS_FILE):
+        self.produtos_file = produtos_file
+        self.journal_file = journal_file
+        self.particoes = VendasParticionadas(vendas_dir)
+        if os.path.exists(vendas_file): # vendas.json de uma versão anterior, com todas as vendas em um só arquivo
+            self.particoes.migrar_arquivo_unico(vendas_file, journal_file + '.compactando')
+        self.journal = JournalVendas(journal_file, self.particoes)
+        self._catalogo_alterado = None # Catálogo cujo snapshot deve ser regravado ao fechar
+        self._registradas_particoes = 0 # Sem journal: vendas registradas desde a abertura (ver 'registradas')
+        self._lock_particoes = threading.Lock()
+        if not USAR_JOURNAL_VENDAS and (os.path.exists(journal_file) or os.path.exists(journal_file + '.compactando')):
+            self.journal.compactar() # Sem journal, as partições voltam a ser a única fonte das vendas
+
+    def carregar_produtos(self):
+        return carregar_produtos_snapshot(self.produtos_file)
+
+    def carregar_vendas(self, data_inicio=None, data_fim=None):
+        return self.journal.ler_vendas(data_inicio, data_fim)
+
+    @property
+    def registradas(self):
+        """Marca do último lote de vendas registrado, comparável à retornada por 'ler_vendas_marcadas'."""
+        return self.journal.registradas if USAR_JOURNAL_VENDAS else self._registradas_particoes
+
+    def ler_vendas_marcadas(self, data_inicio=None, data_fim=None):
+        """Vendas do período e a marca do último lote incluído nelas; pode ser chamada de outra thread."""
+        if USAR_JOURNAL_VENDAS:
+            return self.journal.ler_vendas_marcadas(data_inicio, data_fim)
+        with self._lock_particoes: # Sem journal, cada registro regrava a partição do mês: leitura e registro se alternam
+            return self.journal.ler_vendas(data_inicio, data_fim), self._registradas_particoes
+
+    @medir_tempo
+    def salvar_produto(self, produtos, produto):
+        self._salvar_produtos(produtos)
+
+    @medir_tempo
+    def salvar_produtos(self, produtos, lista_produtos):
+        self._salvar_produtos(produtos) # O arquivo inteiro é regravado uma única vez para o lote
+
+    def excluir_produto(self, produtos, codigo):
+        self._salvar_produtos(produtos)
+
+    @medir_tempo
+    def registrar_vendas(self, produtos, historico, novas_vendas):
+        if USAR_JOURNAL_VENDAS:
+            self.journal.registrar_lote(novas_vendas) # Acrescenta apenas as novas vendas ao journal
+        else:
+            with self._lock_particoes:
+                self.particoes.acrescentar(novas_vendas, GRAVACAO_EM_SEGUNDO_PLANO) # Regrava só a partição do mês das vendas
+                self._registradas_particoes += len(novas_vendas)
+        self._salvar_produtos(produtos) # Salva o estoque atualizado
+
+    def _salvar_produtos(self, produtos):
+        self._catalogo_alterado = produtos
+        if GRAVACAO_EM_SEGUNDO_PLANO:
+            # A thread recebe um retrato imutável: mudanças feitas depois (inclusive desfeitas) não vazam para o arquivo
+            gravador_json.agendar(produtos.retrato(), self.produtos_file)
+        else:
+            salvar_dados(produtos.registros(), self.produtos_file)
+
+    def fechar(self):
+        self.journal.fechar()
+        gravador_json.esperar()
+        if self._catalogo_alterado is not None: # Deixa o snapshot em dia para a próxima abertura ser rápida
+            salvar_produtos_snapshot(self._catalogo_alterado.como_lista(), self.produtos_file)
+            self._catalogo_alterado = None
+
+class ArmazenamentoSQLite:
+    """Armazenamento em um banco SQLite em modo WAL, com tabelas indexadas.
+
+    Cada operação grava apenas as linhas afetadas, e uma venda (baixa de
+    estoque + registro da venda e dos itens) é uma única transação.
+    """
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS produtos (
+            id INTEGER PRIMARY KEY,
+            codigo TEXT NOT NULL UNIQUE,
+            nome TEXT NOT NULL,
+            preco REAL NOT NULL,
+            estoque INTEGER NOT NULL,
+            estoque_minimo INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS vendas (
+            id INTEGER PRIMARY KEY,
+            data_hora TEXT NOT NULL,
+            total REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_vendas_data_hora ON vendas (data_hora);
+        CREATE TABLE IF NOT EXISTS itens_venda (
+            venda_id INTEGER NOT NULL REFERENCES vendas (id),
+            codigo TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            preco_unitario REAL NOT NULL,
+            subtotal REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_itens_venda_venda ON itens_venda (venda_id);
+        CREATE INDEX IF NOT EXISTS idx_itens_venda_codigo ON itens_venda (codigo);
+    """
+
+    def __init__(self, caminho=SQLITE_FILE):
+        self.caminho = caminho
+        self.conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute("PRAGMA synchronous=NORMAL") # Seguro em WAL: uma queda perde no máximo as últimas transações, sem corromper
+        self.conexao.execute("PRAGMA foreign_keys=ON")
+        self.conexao.executescript(self.ESQUEMA)
+        colunas = [linha[1] for linha in self.conexao.execute("PRAGMA table_info(produtos)")]
+        if 'estoque_minimo' not in colunas: # Bancos criados antes do estoque mínimo por produto
+            self.conexao.execute("ALTER TABLE produtos ADD COLUMN estoque_minimo INTEGER")
+        self.registradas = self._ultima_venda(self.conexao) # Id da última venda: marca até onde uma leitura chegou
+
+    @staticmethod
+    def _ultima_venda(conexao):
+        return conexao.execute("SELECT COALESCE(MAX(id), 0) FROM vendas").fetchone()[0]
+
+    @contextlib.contextmanager
+    def _transacao(self):
+        """Transação que confirma tudo ou desfaz tudo; erros do SQLite saem como ErroArmazenamento."""
+        try:
+            with self.conexao:
+                yield self.conexao
+        except sqlite3.Error as e:
+            raise ErroArmazenamento(f"Erro no banco de dados {self.caminho}: {e}") from e
+
+    def carregar_produtos(self):
+        lista_produtos = []
+        for codigo, nome, preco, estoque, estoque_minimo in self.conexao.execute(
+                "SELECT codigo, nome, preco, estoque, estoque_minimo FROM produtos ORDER BY id"):
+            produto = {'codigo': codigo, 'nome': nome, 'preco': preco, 'estoque': estoque}
+            if estoque_minimo is not None:
+                produto['estoque_minimo'] = estoque_minimo
+            lista_produtos.append(produto)
+        return lista_produtos
+
+    def carregar_vendas(self, data_inicio=None, data_fim=None):
+        return self._ler_vendas(self.conexao, data_inicio, data_fim)
+
+    def ler_vendas_marcadas(self, data_inicio=None, data_fim=None):
+        """Vendas do período e a marca do último lote incluído nelas; pode ser chamada de outra thread.
+
+        Usa uma conexão própria, em uma transação de leitura: em modo WAL ela
+        vê o banco como estava no início, sem bloquear nem ver as vendas
+        registradas enquanto isso pela conexão principal.
+        """
+        try:
+            conexao = sqlite3.connect(self.caminho)
+            try:
+                conexao.execute("BEGIN")
+                marca = self._ultima_venda(conexao)
+                return self._ler_vendas(conexao, data_inicio, data_fim), marca
+            finally:
+                conexao.close()
+        except sqlite3.Error as e:
+            raise ErroArmazenamento(f"Erro no banco de dados {self.caminho}: {e}") from e
+
+    @staticmethod
+    def _ler_vendas(conexao, data_inicio, data_fim):
+        condicoes, parametros = [], []
+        if data_inicio:
+            condicoes.append("vendas.data_hora >= ?")
+            parametros.append(data_inicio)
+        if data_fim: # 'AAAA-MM-DD HH:MM:SS' de qualquer hora do último dia é menor que o dia seguinte
+            condicoes.append("vendas.data_hora < ?")
+            parametros.append((datetime.strptime(data_fim, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+        filtro = " WHERE " + " AND ".join(condicoes) if condicoes else "" # Usa o índice por data/hora
+        vendas_carregadas = []
+        por_id = {}
+        for venda_id, data_hora, total in conexao.execute(
+                "SELECT id, data_hora, total FROM vendas" + filtro + " ORDER BY id", parametros):
+            venda = {'data_hora': data_hora, 'itens': [], 'total': total}
+            por_id[venda_id] = venda
+            vendas_carregadas.append(venda)
+        cursor = conexao.execute(
+            "SELECT venda_id, codigo, nome, quantidade, preco_unitario, subtotal FROM itens_venda "
+            "JOIN vendas ON vendas.id = itens_venda.venda_id" + filtro + " ORDER BY venda_id, itens_venda.rowid", parametros)
+        for venda_id, codigo, nome, quantidade, preco_unitario, subtotal in cursor:
+            por_id[venda_id]['itens'].append({'codigo': codigo, 'nome': nome, 'quantidade': quantidade,
+                                              'preco_unitario': preco_unitario, 'subtotal': subtotal})
+        return vendas_carregadas
+
+    @medir_tempo
+    def salvar_produto(self, produtos, produto):
+        with self._transacao():
+            self._gravar_produtos([produto])
+
+    @medir_tempo
+    def salvar_produtos(self, produtos, lista_produtos):
+        with self._transacao(): # Uma transação para o lote inteiro
+            self._gravar_produtos(lista_produtos)
+
+    def excluir_produto(self, produtos, codigo):
+        with self._transacao():
+            self.conexao.execute("DELETE FROM produtos WHERE codigo = ?", (normalizar_codigo(codigo),))
+
+    @medir_tempo
+    def registrar_vendas(self, produtos, historico, novas_vendas):
+        baixas = {}
+        for venda in novas_vendas:
+            for item in venda['itens']:
+                baixas[item['codigo']] = baixas.get(item['codigo'], 0) + item['quantidade']
+        with self._transacao():
+            for codigo, quantidade in baixas.items():
+                cursor = self.conexao.execute(
+                    "UPDATE produtos SET estoque = estoque - ? WHERE codigo = ? AND estoque >= ?",
+                    (quantidade, codigo, quantidade))
+                if cursor.rowcount != 1: # Desfaz a transação; o motor devolve o estoque em memória
+                    raise EstoqueInsuficiente(f"Estoque insuficiente no banco para o produto {codigo}.")
+            ultima = self._gravar_vendas(novas_vendas)
+        self.registradas = ultima
+
+    def fechar(self):
+        self.conexao.close()
+
+    def _gravar_produtos(self, lista_produtos):
+        self.conexao.executemany(
+            "INSERT INTO produtos (codigo, nome, preco, estoque, estoque_minimo) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (codigo) DO UPDATE SET nome = excluded.nome, preco = excluded.preco, "
+            "estoque = excluded.estoque, estoque_minimo = excluded.estoque_minimo",
+            [(p['codigo'], p['nome'], p['preco'], p['estoque'], p.get('estoque_minimo')) for p in lista_produtos])
+
+    def _gravar_vendas(self, lista_vendas):
+        """Insere as vendas e seus itens; retorna o id da última."""
+        venda_id = None
+        for venda in lista_vendas:
+            venda_id = self.conexao.execute("INSERT INTO vendas (data_hora, total) VALUES (?, ?)",
+                                            (venda['data_hora'], venda['total'])).lastrowid
+            self.conexao.executemany(
+                "INSERT INTO itens_venda (venda_id, codigo, nome, quantidade, preco_unitario, subtotal) VALUES (?, ?, ?, ?, ?, ?)",
+                [(venda_id, i['codigo'], i['nome'], i['quantidade'], i['preco_unitario'], i['subtotal']) for i in venda['itens']])
+        return venda_id
+
+class ArmazenamentoRemoto:
+    """Armazenamento de um caixa cliente: os dados pertencem ao servidor PDV.
+
+    O caixa mantém uma cópia local do catálogo para consultas rápidas e
+    valida as vendas contra ela (de forma otimista); o servidor valida de
+    novo contra o estoque real e é quem decide. Se o servidor recusar, o
+    estoque local dos produtos envolvidos é sincronizado antes de a venda
+    ser desfeita localmente. Produtos cadastrados, alterados ou excluídos
+    por outros caixas chegam com 'sincronizar_catalogo', e um código que não
+    está no catálogo local é procurado no servidor com 'buscar_produto'.
+    """
+
+    def __init__(self, host=SERVIDOR_PDV_HOST, porta=SERVIDOR_PDV_PORTA):
+        self.host = host
+        self.porta = porta
+        self.cliente = ClientePDV(host, porta)
+        self.registradas = 0 # Marca do servidor para o último lote registrado por este caixa
+        self.versao_catalogo = None # Versão do catálogo do servidor já aplicada ao catálogo local
+
+    def carregar_produtos(self):
+        alteracoes = self.cliente.chamar('alteracoes', desde=None) # O catálogo inteiro e a versão dele
+        self.versao_catalogo = alteracoes['versao']
+        return alteracoes['produtos']
+
+    def buscar_produto(self, produtos, codigo):
+        """Busca no servidor um produto que não está no catálogo local (por exemplo, cadastrado em outro caixa) e o inclui nele."""
+        produto_servidor = self.cliente.chamar('buscar', codigo=codigo)
+        if produto_servidor is None:
+            return None
+        produtos.inserir_ou_atualizar(produto_servidor)
+        return produtos.buscar(codigo)
+
+    def sincronizar_catalogo(self, produtos):
+        """Aplica ao catálogo local as alterações feitas no servidor desde a última sincronização. Retorna os códigos afetados."""
+        alteracoes = self.cliente.chamar('alteracoes', desde=self.versao_catalogo)
+        for produto_servidor in alteracoes['produtos']:
+            produtos.inserir_ou_atualizar(produto_servidor)
+        for codigo in alteracoes['removidos']:
+            produtos.remover(codigo)
+        self.versao_catalogo = alteracoes['versao']
+        return [produto['codigo'] for produto in alteracoes['produtos']] + alteracoes['removidos']
+
+    def carregar_vendas(self, data_inicio=None, data_fim=None):
+        return self.cliente.chamar('vendas', data_inicio=data_inicio, data_fim=data_fim)
+
+    def ler_vendas_marcadas(self, data_inicio=None, data_fim=None):
+        """Vendas do período e a marca do servidor para o último lote incluído nelas; pode ser chamada de outra thread."""
+        cliente = ClientePDV(self.host, self.porta) # Conexão própria: a leitura não segura a conexão usada pelas vendas
+        try:
+            resposta = cliente.chamar('vendas_marcadas', data_inicio=data_inicio, data_fim=data_fim)
+        finally:
+            cliente.fechar()
+        return resposta['vendas'], resposta['registradas']
+
+    @medir_tempo
+    def salvar_produto(self, produtos, produto):
+        self.cliente.chamar('salvar_produto', produto=produto)
+
+    @medir_tempo
+    def salvar_produtos(self, produtos, lista_produtos):
+        self.cliente.chamar('salvar_produtos', lista_produtos=lista_produtos)
+
+    def excluir_produto(self, produtos, codigo):
+        self.cliente.chamar('excluir_produto', codigo=codigo)
+
+    @medir_tempo
+    def registrar_vendas(self, produtos, historico, novas_vendas):
+        carrinhos = [{'data_hora': venda['data_hora'],
+                      'itens': [{'codigo': item['codigo'], 'quantidade': item['quantidade']} for item in venda['itens']]}
+                     for venda in novas_vendas]
+        resposta = self.cliente.chamar('registrar_vendas', carrinhos=carrinhos)
+        if resposta['rejeitados']:
+            reservado = {}
+            for venda in novas_vendas:
+                for item in venda['itens']:
+                    chave = normalizar_codigo(item['codigo'])
+                    reservado[chave] = reservado.get(chave, 0) + item['quantidade']
+            for produto_servidor in resposta['produtos']:
+                produto = produtos.buscar(produto_servidor['codigo'])
+                if produto is not None: # O motor devolve a reserva em seguida, deixando o estoque igual ao do servidor
+                    produtos.definir_estoque(produto, produto_servidor['estoque'] - reservado.get(normalizar_codigo(produto['codigo']), 0))
+            tipo, mensagem = resposta['rejeitados'][0][1:]
+            raise ERROS_CHECKOUT.get(tipo, ErroCheckout)(mensagem)
+        self.registradas = resposta['registradas']
+        for venda, venda_servidor in zip(novas_vendas, resposta['vendas']):
+            venda.update(venda_servidor) # Preços e totais valem como registrados pelo servidor
+        for produto_servidor in resposta['produtos']:
+            produto = produtos.buscar(produto_servidor['codigo'])
+            if produto is not None: # Traz também as baixas feitas pelos outros caixas
+                produtos.definir_estoque(produto, produto_servidor['estoque'])
+
+    def fechar(self):
+        self.cliente.fechar()
+
+def criar_armazenamento(backend=None):
+    """Cria o armazenamento configurado em BACKEND_ARMAZENAMENTO."""
+    backend = backend or BACKEND_ARMAZENAMENTO
+    if backend == 'json':
+        return ArmazenamentoJSON()
+    if backend == 'sqlite':
+        return ArmazenamentoSQLite()
+    if backend == 'remoto':
+        return ArmazenamentoRemoto()
+    raise ValueError(f"Backend de armazenamento desconhecido: {backend!r}")
+
+def migrar_json_para_sqlite(caminho_sqlite=SQLITE_FILE):
+    """Copia produtos e vendas dos arquivos JSON (incluindo o journal) para um banco SQLite vazio."""
+    origem = ArmazenamentoJSON()
+    destino = ArmazenamentoSQLite(caminho_sqlite)
+    try:
+        if destino.conexao.execute("SELECT EXISTS (SELECT 1 FROM produtos) OR EXISTS (SELECT 1 FROM vendas)").fetchone()[0]:
+            raise ValueError(f"O banco {caminho_sqlite} já contém dados; a migração só é feita uma vez.")
+        lista_produtos = CatalogoProdutos(origem.carregar_produtos()).como_lista() # Descarta códigos duplicados
+        lista_vendas = origem.carregar_vendas()
+        with destino.conexao:
+            destino._gravar_produtos(lista_produtos)
+            destino._gravar_vendas(lista_vendas)
+        return len(lista_produtos), len(lista_vendas)
+    finally:
+        destino.fechar()
+        origem.fechar()
+
+# --- Motor de Checkout ---
+
+class ErroCheckout(Exception):
+    """Carrinho que não pode ser vendido; nada foi alterado."""
+
+class ProdutoNaoEncontrado(ErroCheckout):
+    pass
+
+class EstoqueInsuficiente(ErroCheckout):
+    pass
+
+# Nome -> classe, para reconstruir no caixa cliente os erros enviados pelo servidor PDV
+ERROS_CHECKOUT = {classe.__name__: classe for classe in (ErroCheckout, ProdutoNaoEncontrado, EstoqueInsuficiente)}
+
+class MotorCheckout:
+    """Finaliza vendas sem depender da interface gráfica.
+
+    Cada carrinho é validado por inteiro (produtos, quantidades e estoque)
+    antes de qualquer alteração; só então o estoque é baixado e a venda
+    registrada. As vendas são gravadas com uma única chamada ao
+    armazenamento, e se essa gravação falhar o estoque em memória é
+    restaurado, de modo que uma venda é aplicada por completo ou não é.
+    """
+
+    def __init__(self, catalogo, historico, armazenamento):
+        self.catalogo = catalogo
+        self.historico = historico
+        self.armazenamento = armazenamento
+
+    def validar(self, carrinho_itens):
+        """Valida um carrinho. Retorna [(produto, quantidade)], somando códigos repetidos."""
+        if not isinstance(carrinho_itens, (list, tuple)):
+            raise ErroCheckout(f"Carrinho inválido: {carrinho_itens!r}.")
+        reservas = {}
+        for item in carrinho_itens:
+            if not isinstance(item, dict) or not isinstance(item.get('codigo'), str):
+                raise ErroCheckout(f"Item de carrinho inválido: {item!r}.")
+            quantidade = item.get('quantidade')
+            if not isinstance(quantidade, int) or isinstance(quantidade, bool) or quantidade <= 0:
+                raise ErroCheckout(f"Quantidade inválida para o produto {item['codigo']}: {quantidade!r}.")
+            produto = self.catalogo.buscar(item['codigo'])
+            if produto is None:
+                raise ProdutoNaoEncontrado(f"Produto com código '{item['codigo']}' não encontrado.")
+            chave = normalizar_codigo(produto['codigo'])
+            reservado = reservas.get(chave, (produto, 0))[1] + quantidade
+            if reservado > produto['estoque']:
+                raise EstoqueInsuficiente(f"Estoque insuficiente para {produto['nome']}. Disponível: {produto['estoque']}")
+            reservas[chave] = (produto, reservado)
+        if not reservas:
+            raise ErroCheckout("O carrinho está vazio.")
+        return list(reservas.values())
+
+    @staticmethod
+    def validar_data_hora(data_hora):
+        """Confere a data/hora informada para uma venda ('AAAA-MM-DD HH:MM:SS'); o histórico é ordenado e particionado por ela."""
+        try:
+            datetime.strptime(data_hora, "%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
+            raise ErroCheckout(f"Data/hora inválida: {data_hora!r}. Use o formato AAAA-MM-DD HH:MM:SS.") from None
+
+    def finalizar(self, carrinho_itens, data_hora=None):
+        """Finaliza uma venda e retorna o registro gravado. Levanta ErroCheckout se o carrinho for inválido."""
+        vendas_concluidas, rejeitados = self.finalizar_lote([{'itens': carrinho_itens, 'data_hora': data_hora}])
+        if rejeitados:
+            raise rejeitados[0][1]
+        return vendas_concluidas[0]
+
+    @medir_tempo
+    def finalizar_lote(self, carrinhos, atomico=False):
+        """Finaliza vários carrinhos com uma única gravação.
+
+        Cada carrinho é uma lista de itens ({'codigo', 'quantidade'}) ou um
+        dicionário {'itens': [...], 'data_hora': 'AAAA-MM-DD HH:MM:SS'} (útil
+        para reprocessar vendas feitas offline). Carrinhos inválidos não
+        impedem os demais, a menos que 'atomico' seja verdadeiro: nesse caso
+        um único carrinho inválido desfaz o lote inteiro.
+        Retorna (vendas concluídas, [(índice, ErroCheckout)]).
+        """
+        novas_vendas, rejeitados, baixas, atingiram_minimo = [], [], [], []
+        try:
+            for indice, carrinho in enumerate(carrinhos):
+                if isinstance(carrinho, dict):
+                    itens, data_hora = carrinho.get('itens'), carrinho.get('data_hora')
+                else:
+                    itens, data_hora = carrinho, None
+                try:
+                    if data_hora is not None:
+                        self.validar_data_hora(data_hora)
+                    reservas = self.validar(itens) # Considera o estoque já baixado pelos carrinhos anteriores do lote
+                except ErroCheckout as e:
+                    rejeitados.append((indice, e))
+                    continue
+
+                venda = {'data_hora': data_hora or datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'itens': [], 'total': 0.0}
+                for produto, quantidade in reservas:
+                    if self.catalogo.baixar_estoque(produto, quantidade):
+                        atingiram_minimo.append(produto)
+                    baixas.append((produto, quantidade))
+                    subtotal = produto['preco'] * quantidade
+                    venda['itens'].append({
+                        'codigo': produto['codigo'],
+                        'nome': produto['nome'],
+                        'quantidade': quantidade,
+                        'preco_unitario': produto['preco'],
+                        'subtotal': subtotal
+                    })
+                    venda['total'] += subtotal
+                novas_vendas.append(venda)
+
+            if atomico and rejeitados:
+                self._devolver(baixas)
+                return [], rejeitados
+            if novas_vendas:
+                self.armazenamento.registrar_vendas(self.catalogo, self.historico, novas_vendas)
+        except BaseException:
+            self._devolver(baixas) # Qualquer falha no meio do lote ou na gravação devolve o estoque reservado
+            raise
+        if novas_vendas:
+            self.historico.acrescentar(novas_vendas, self.armazenamento.registradas)
+            for produto in atingiram_minimo:
+                notificar_estoque_baixo(produto)
+        return novas_vendas, rejeitados
+
+    def _devolver(self, baixas):
+        for produto, quantidade in reversed(baixas):
+            self.catalogo.baixar_estoque(produto, -quantidade)
+        baixas.clear()
+
+class CarrinhoVenda:
+    """Carrinho indexado pelo código do produto, com o total mantido a cada adição.
+
+    Somar a quantidade de um código já presente é uma consulta ao dicionário,
+    e cada item guarda a posição (linha) em que foi incluído, para que a
+    interface redesenhe só a linha alterada.
+    """
+
+    def __init__(self):
+        self._por_codigo = {}
+        self.total = 0.0
+
+    def adicionar(self, produto, quantidade):
+        """Soma 'quantidade' do produto ao carrinho. Retorna (item, True se o código é novo no carrinho)."""
+        codigo = normalizar_codigo(produto['codigo'])
+        item = self._por_codigo.get(codigo)
+        novo = item is None
+        if novo:
+            item = {'codigo': codigo, 'quantidade': 0, 'nome': produto['nome'], 'preco_unitario': produto['preco'],
+                    'posicao': len(self._por_codigo)}
+            self._por_codigo[codigo] = item
+        item['quantidade'] += quantidade
+        self.total += quantidade * item['preco_unitario']
+        return item, novo
+
+    def quantidade(self, codigo):
+        item = self._por_codigo.get(normalizar_codigo(codigo))
+        return item['quantidade'] if item else 0
+
+    def itens(self):
+        """Itens na ordem em que entraram no carrinho, no formato aceito por MotorCheckout."""
+        return list(self._por_codigo.values())
+
+    def limpar(self):
+        self._por_codigo.clear()
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self._por_codigo)
+
+@medir_tempo
+def inicializar_dados(backend=None):
+    """Abre o armazenamento e carrega os produtos nas variáveis globais do programa (as vendas, só quando usadas)."""
+    global armazenamento, produtos, historico_vendas, motor_checkout
+    armazenamento = criar_armazenamento(backend)
+    produtos = CatalogoProdutos(armazenamento.carregar_produtos())
+    historico_vendas = HistoricoVendas(armazenamento.carregar_vendas, armazenamento.ler_vendas_marcadas)
+    motor_checkout = MotorCheckout(produtos, historico_vendas, armazenamento)
+    atexit.register(armazenamento.fechar)
+
+# Carrega os dados ao iniciar o programa (quando executado diretamente, só depois de ler as opções da linha de comando)
+if __name__ != "__main__":
+    inicializar_dados()
 
 # --- Funções de Negócio ---
 
-def adicionar_ou_atualizar_produto(codigo, nome, preco_str, estoque_str):
-    """Adiciona um novo produto ou atualiza um existente."""
+# Funções chamadas com o produto quando uma venda leva seu estoque ao estoque mínimo ou abaixo dele
+ouvintes_estoque_baixo = []
+
+def registrar_ouvinte_estoque_baixo(funcao):
+    """Registra uma função a ser chamada com o produto que atingiu o estoque mínimo."""
+    ouvintes_estoque_baixo.append(funcao)
+
+def notificar_estoque_baixo(produto):
+    """Avisa os ouvintes de que o produto atingiu o estoque mínimo."""
+    for funcao in ouvintes_estoque_baixo:
+        funcao(produto)
+
+def montar_produto(codigo, nome, preco_str, estoque_str, estoque_minimo_str=''):
+    """Valida os campos de um produto e retorna o dicionário a gravar. Levanta ValueError com a mensagem do erro."""
     if not codigo or not nome or not preco_str or not estoque_str:
-        messagebox.showerror("Erro de Entrada", "Todos os campos do produto são obrigatórios.")
-        return False
+        raise ValueError("Todos os campos do produto são obrigatórios.")
 
     try:
         preco = float(preco_str.replace(',', '.')) # Aceita vírgula ou ponto
         estoque = int(estoque_str)
-        if preco <= 0 or estoque < 0:
-            messagebox.showerror("Erro de Entrada", "Preço deve ser positivo e Estoque não pode ser negativo.")
-            return False
+        estoque_minimo = int(estoque_minimo_str) if estoque_minimo_str else None
     except ValueError:
-        messagebox.showerror("Erro de Entrada", "Preço e Estoque devem ser números válidos.")
+        raise ValueError("Preço, Estoque e Estoque Mínimo devem ser números válidos.") from None
+    if preco <= 0 or estoque < 0 or (estoque_minimo is not None and estoque_minimo < 0):
+        raise ValueError("Preço deve ser positivo e Estoque e Estoque Mínimo não podem ser negativos.")
+
+    produto = {'codigo': codigo.upper(), 'nome': nome.title(), 'preco': preco, 'estoque': estoque}
+    if estoque_minimo is not None:
+        produto['estoque_minimo'] = estoque_minimo
+    return produto
+
+def adicionar_ou_atualizar_produto(codigo, nome, preco_str, estoque_str, estoque_minimo_str=''):
+    """Adiciona um novo produto ou atualiza um existente. O estoque mínimo é opcional."""
+    try:
+        produto = montar_produto(codigo, nome, preco_str, estoque_str, estoque_minimo_str)
+    except ValueError as e:
+        messagebox.showerror("Erro de Entrada", str(e))
         return False
 
-    # Verifica se o produto já existe para atualização
-    for i, produto in enumerate(produtos):
-        if produto['codigo'].upper() == codigo.upper():
-            produtos[i] = {'codigo': codigo.upper(), 'nome': nome.title(), 'preco': preco, 'estoque': estoque}
-            salvar_dados(produtos, PRODUTOS_FILE)
-            messagebox.showinfo("Sucesso", f"Produto '{nome}' atualizado com sucesso!")
-            return True
-
-    # Se não existe, adiciona como novo
-    novo_produto = {'codigo': codigo.upper(), 'nome': nome.title(), 'preco': preco, 'estoque': estoque}
-    produtos.append(novo_produto)
-    salvar_dados(produtos, PRODUTOS_FILE)
-    messagebox.showinfo("Sucesso", f"Produto '{nome}' cadastrado com sucesso!")
+    # Atualiza o produto se o código já existir; caso contrário, adiciona como novo
+    anterior = produtos.buscar(produto['codigo'])
+    try:
+        with Cronometro('adicionar_ou_atualizar_produto'): # Mede só a gravação, sem o tempo dos diálogos
+            atualizado = produtos.inserir_ou_atualizar(produto)
+            armazenamento.salvar_produto(produtos, produto)
+    except (ErroServidorPDV, OSError) as e:
+        # Desfaz no catálogo local, para o caixa não divergir do servidor (ou do arquivo)
+        if anterior is None:
+            produtos.remover(produto['codigo'])
+        else:
+            produtos.inserir_ou_atualizar(anterior)
+        messagebox.showerror("Erro ao Gravar", f"O produto não foi salvo: {e}")
+        return False
+    if atualizado:
+        messagebox.showinfo("Sucesso", f"Produto '{nome}' atualizado com sucesso!")
+    else:
+        messagebox.showinfo("Sucesso", f"Produto '{nome}' cadastrado com sucesso!")
     return True
 
+@medir_tempo
 def buscar_produto_por_codigo(codigo):
-    """Retorna um produto pelo código."""
-    for produto in produtos:
-        if produto['codigo'].upper() == codigo.upper():
-            return produto
-    return None
+    """Retorna um produto pelo código (no caixa cliente, procura no servidor o que não está no catálogo local)."""
+    produto = produtos.buscar(codigo)
+    if produto is None and isinstance(armazenamento, ArmazenamentoRemoto):
+        produto = armazenamento.buscar_produto(produtos, codigo)
+    return produto
+
+@medir_tempo
+def pesquisar_produtos(texto, limite=AUTOCOMPLETAR_LIMITE):
+    """Retorna os produtos cujo código é o texto ou cujo nome se parece com ele."""
+    return produtos.pesquisar(texto, limite)
 
 def realizar_venda_logica(carrinho_itens):
     """Processa a lógica da venda e atualiza o estoque."""
-    total_venda = 0.0
-    venda_detalhes = {
-        'data_hora': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        'itens': [],
-        'total': 0.0
-    }
-
-    for item in carrinho_itens:
-        produto = buscar_produto_por_codigo(item['codigo'])
-        if produto: # Garante que o produto ainda existe
-            if produto['estoque'] >= item['quantidade']:
-                produto['estoque'] -= item['quantidade']
-                subtotal = produto['preco'] * item['quantidade']
-                total_venda += subtotal
-                venda_detalhes['itens'].append({
-                    'codigo': item['codigo'],
-                    'nome': produto['nome'],
-                    'quantidade': item['quantidade'],
-                    'preco_unitario': produto['preco'],
-                    'subtotal': subtotal
-                })
-            else:
-                messagebox.showwarning("Estoque Insuficiente", f"Estoque insuficiente para {produto['nome']}. Disponível: {produto['estoque']}")
-                return False, 0.0 # Retorna falso se não foi possível concluir a venda
+    try:
+        with Cronometro('realizar_venda_logica'):
+            venda = motor_checkout.finalizar(carrinho_itens)
+    except EstoqueInsuficiente as e:
+        messagebox.showwarning("Estoque Insuficiente", str(e))
+        return False, 0.0 # Retorna falso se não foi possível concluir a venda
+    except ErroCheckout as e:
+        messagebox.showwarning("Venda Não Concluída", str(e))
+        return False, 0.0
+    except (ErroServidorPDV, OSError) as e: # O motor já devolveu o estoque reservado
+        messagebox.showerror("Venda Não Concluída", f"A venda não foi registrada: {e}")
+        return False, 0.0
+    return True, venda['total']
+
+@medir_tempo
+def excluir_produto_logica(codigo):
+    """Remove um produto do estoque. Retorna True se removeu, False se não existia e None se a gravação falhou."""
+    anterior = produtos.buscar(codigo)
+    if not produtos.remover(codigo):
+        return False
+    try:
+        armazenamento.excluir_produto(produtos, codigo)
+    except (ErroServidorPDV, OSError) as e:
+        produtos.inserir_ou_atualizar(anterior) # Desfaz no catálogo local, para o caixa não divergir do servidor
+        messagebox.showerror("Erro ao Excluir", f"O produto não foi excluído: {e}")
+        return None
+    return True
 
-    if total_venda > 0:
-        venda_detalhes['total'] = total_venda
-        vendas.append(venda_detalhes)
-        salvar_dados(produtos, PRODUTOS_FILE) # Salva o estoque atualizado
-        salvar_dados(vendas, VENDAS_FILE)     # Salva o registro da venda
-        return True, total_venda
-    return False, 0.0
+colunas_vendas = None # Cache colunar das vendas, aberto na primeira análise
+
+@medir_tempo
+def analisar_vendas(data_inicio=None, data_fim=None):
+    """Atualiza o cache colunar com as vendas novas e retorna as análises do período (requer NumPy)."""
+    global colunas_vendas
+    if analise_vendas is None:
+        raise RuntimeError("A análise de vendas requer o NumPy (pip install numpy).")
+    if colunas_vendas is None:
+        colunas_vendas = analise_vendas.ColunasVendas(ANALISE_CACHE_DIR)
+    colunas_vendas.atualizar(historico_vendas.lista())
+    return colunas_vendas.analisar(data_inicio, data_fim)
+
+def _dialeto_csv(arquivo):
+    """Detecta o separador do CSV pelo início do arquivo (';', ',' ou tabulação)."""
+    amostra = arquivo.read(65536)
+    arquivo.seek(0)
+    try:
+        return csv.Sniffer().sniff(amostra, delimiters=';,\t')
+    except csv.Error:
+        return csv.excel
+
+@medir_tempo
+def importar_produtos_csv(caminho, tamanho_lote=IMPORTACAO_CSV_LOTE):
+    """Inclui ou atualiza produtos a partir de um CSV, gravando o catálogo uma única vez ao final.
+
+    O cabeçalho precisa da coluna 'codigo' e das colunas a alterar (nome,
+    preco, estoque, estoque_minimo; maiúsculas e acentos são ignorados).
+    Produtos novos precisam de todos os campos obrigatórios; nos existentes,
+    colunas ausentes ou vazias mantêm o valor atual, de modo que um arquivo
+    só com código e preço atualiza apenas os preços. O arquivo é lido em
+    lotes de 'tamanho_lote' linhas, cada lote validado e aplicado ao
+    catálogo de uma vez; linhas inválidas não interrompem a importação.
+    Se a leitura de um lote ou a gravação final falhar, o catálogo em
+    memória é restaurado. Retorna {'incluidos', 'atualizados', 'rejeitados': [(linha, motivo)], 'codigos'}.
+    """
+    originais = {}  # código -> produto antes da importação (None se novo)
+    aplicados = []  # (produto, registro substituído), na ordem aplicada
+    rejeitados = []
+    try:
+        with open(caminho, 'r', encoding='utf-8-sig', newline='') as f:
+            leitor = csv.reader(f, _dialeto_csv(f))
+            cabecalho = ['_'.join(palavras_nome(coluna)) for coluna in next(leitor, [])]
+            if 'codigo' not in cabecalho:
+                raise ValueError("O CSV precisa de um cabeçalho com a coluna 'codigo'.")
+            posicoes = {coluna: cabecalho.index(coluna) for coluna in CSV_COLUNAS if coluna in cabecalho}
+            numero_linha = 1 # O cabeçalho é a linha 1
+            while lote := list(itertools.islice(leitor, tamanho_lote)):
+                validos = {} # Código -> produto; no mesmo lote, a última linha de um código prevalece
+                for linha in lote:
+                    numero_linha += 1
+                    if not any(campo.strip() for campo in linha):
+                        continue # Linhas em branco são ignoradas
+                    campos = {coluna: linha[i].strip() if i < len(linha) else '' for coluna, i in posicoes.items()}
+                    codigo = normalizar_codigo(campos['codigo'])
+                    atual = (validos.get(codigo) or produtos.buscar(codigo)) if codigo else None
+                    for coluna in CSV_COLUNAS[1:]:
+                        if not campos.get(coluna) and atual is not None:
+                            valor = atual.get(coluna)
+                            campos[coluna] = '' if valor is None else str(valor)
+                    try:
+                        validos[codigo] = montar_produto(codigo, campos.get('nome', ''), campos.get('preco', ''),
+                                                         campos.get('estoque', ''), campos.get('estoque_minimo', ''))
+                    except ValueError as e:
+                        rejeitados.append((numero_linha, f"{codigo or '(sem código)'}: {e}"))
+                lista_lote = list(validos.values())
+                for produto, anterior in zip(lista_lote, produtos.inserir_ou_atualizar_lote(lista_lote)):
+                    originais.setdefault(produto['codigo'], anterior)
+                    aplicados.append((produto, anterior))
+
+        codigos = list(originais)
+        if codigos:
+            armazenamento.salvar_produtos(produtos, [produtos.buscar(codigo) for codigo in codigos])
+    except Exception: # Erro de leitura num lote posterior ou falha na gravação: nada da importação fica no catálogo
+        for produto, anterior in reversed(aplicados): # Desfaz na ordem inversa, inclusive códigos repetidos em lotes diferentes
+            if anterior is None:
+                produtos.remover(produto['codigo'])
+            else:
+                produtos.inserir_ou_atualizar(anterior)
+        raise
+    incluidos = sum(1 for anterior in originais.values() if anterior is None)
+    return {'incluidos': incluidos, 'atualizados': len(originais) - incluidos, 'rejeitados': rejeitados, 'codigos': codigos}
+
+def resumo_importacao(resultado, maximo_rejeitados=None):
+    """Texto com o resultado de importar_produtos_csv (mostrando até 'maximo_rejeitados' linhas rejeitadas)."""
+    rejeitados = resultado['rejeitados']
+    linhas = [f"{resultado['incluidos']} produto(s) incluído(s), {resultado['atualizados']} atualizado(s), "
+              f"{len(rejeitados)} linha(s) rejeitada(s)."]
+    linhas += [f"Linha {numero}: {motivo}" for numero, motivo in rejeitados[:maximo_rejeitados]]
+    if maximo_rejeitados is not None and len(rejeitados) > maximo_rejeitados:
+        linhas.append(f"... e mais {len(rejeitados) - maximo_rejeitados} linha(s) rejeitada(s).")
+    return "\n".join(linhas)
+
+@medir_tempo
+def exportar_produtos_csv(caminho):
+    """Grava o catálogo em CSV, no formato aceito pela importação. Retorna a quantidade de produtos."""
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8', newline='') as f:
+        escritor = csv.writer(f, delimiter=CSV_DELIMITADOR)
+        escritor.writerow(CSV_COLUNAS)
+        escritor.writerows((p['codigo'], p['nome'], p['preco'], p['estoque'], p.get('estoque_minimo', '')) for p in produtos)
+    os.replace(temporario, caminho)
+    return len(produtos)
+
+# --- Relatórios ---
+# Os relatórios são geradores de blocos (texto, linhas CSV, progresso de 0 a 1): a tela recebe o texto aos
+# poucos e 'gravar_relatorio' grava o mesmo relatório em TXT ou CSV sem montá-lo inteiro na memória.
+# Eles percorrem só o retrato recebido, sem tocar no catálogo nem no histórico, e podem rodar em outra thread.
+
+COLUNAS_RELATORIO_ESTOQUE = ('codigo', 'nome', 'estoque')
+COLUNAS_RELATORIO_VENDAS = ('venda', 'data_hora', 'codigo', 'nome', 'quantidade', 'preco_unitario', 'subtotal')
+
+def retrato_estoque_baixo(limite):
+    """Retorna [(código, nome, estoque)] dos produtos com estoque até 'limite', copiados no momento da chamada."""
+    return [(produto['codigo'], produto['nome'], produto['estoque']) for produto in produtos.com_estoque_ate(limite)]
+
+def relatorio_estoque_baixo(lista_produtos, limite):
+    """Gera o relatório de estoque baixo a partir de retrato_estoque_baixo(limite), um bloco por produto."""
+    if not lista_produtos:
+        yield f"Nenhum produto com estoque abaixo de {limite} unidades.\n", [COLUNAS_RELATORIO_ESTOQUE], 1.0
+        return
+    yield f"--- Produtos com Estoque Abaixo ou Igual a {limite} Unidades ---\n\n", [COLUNAS_RELATORIO_ESTOQUE], 0.0
+    for i, (codigo, nome, estoque) in enumerate(lista_produtos, 1):
+        texto = f"Código: {codigo}\nNome: {nome}\nEstoque: {estoque}\n" + "-" * 30 + "\n"
+        yield texto, [(codigo, nome, estoque)], i / len(lista_produtos)
+
+def relatorio_vendas(vendas, data_inicio=None, data_fim=None):
+    """Gera o relatório das vendas do período (uma sequência que não muda mais), um bloco por venda."""
+    if not vendas:
+        texto = "Nenhuma venda registrada ainda.\n" if data_inicio is None and data_fim is None else "Nenhuma venda no período.\n"
+        yield texto, [COLUNAS_RELATORIO_VENDAS], 1.0
+        return
+    if data_inicio is None and data_fim is None:
+        yield "--- Relatório de Todas as Vendas ---\n\n", [COLUNAS_RELATORIO_VENDAS], 0.0
+    else:
+        yield f"--- Relatório de Vendas ({data_inicio or 'início'} a {data_fim or 'hoje'}) ---\n\n", [COLUNAS_RELATORIO_VENDAS], 0.0
+    total_geral = 0.0
+    for i, venda in enumerate(vendas, 1):
+        linhas = [f"Venda #{i} - Data/Hora: {venda['data_hora']}", "Itens:"]
+        linhas += [f"  - {item['nome']} ({item['quantidade']}x) @ R$ {item['preco_unitario']:.2f} = R$ {item['subtotal']:.2f}"
+                   for item in venda['itens']]
+        linhas += [f"Total da Venda: R$ {venda['total']:.2f}", "=" * 40, "", ""]
+        linhas_csv = [(i, venda['data_hora'], item['codigo'], item['nome'], item['quantidade'], item['preco_unitario'], item['subtotal'])
+                      for item in venda['itens']]
+        total_geral += venda['total'] # Os agregados exigiriam carregar o histórico inteiro
+        yield "\n".join(linhas), linhas_csv, i / len(vendas)
+    yield f"TOTAL GERAL ARRECADADO: R$ {total_geral:.2f}\n", [], 1.0
+
+def gravar_relatorio(blocos, caminho):
+    """Grava os blocos de um relatório em 'caminho' à medida que são gerados, repassando-os a quem consome.
+
+    O arquivo é CSV se o nome terminar em .csv e texto nos demais casos. A
+    gravação vai para um temporário renomeado só no final: se o consumo for
+    interrompido (relatório cancelado), o arquivo de destino não é alterado.
+    """
+    como_csv = caminho.lower().endswith('.csv')
+    temporario = caminho + '.tmp'
+    try:
+        with open(temporario, 'w', encoding='utf-8', newline='' if como_csv else None) as f:
+            escritor = csv.writer(f, delimiter=CSV_DELIMITADOR)
+            for texto, linhas_csv, progresso in blocos:
+                if como_csv:
+                    escritor.writerows(linhas_csv)
+                else:
+                    f.write(texto)
+                yield texto, linhas_csv, progresso
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+# --- Servidor PDV (vários caixas) ---
+# Protocolo: uma linha JSON por pedido ({"op": ..., parâmetros}) e uma por resposta
+# ({"ok": true, "resultado": ...} ou {"ok": false, "tipo": ..., "erro": ...}).
+
+def _codificar_mensagem(mensagem):
+    return (json.dumps(mensagem, ensure_ascii=False, separators=(',', ':'), default=_para_json) + '\n').encode('utf-8')
+
+class ErroServidorPDV(Exception):
+    """Erro informado pelo servidor PDV ou na comunicação com ele."""
+
+class ServidorPDV:
+    """Servidor asyncio que detém o catálogo e as vendas e atende vários caixas.
+
+    Todos os pedidos são executados no laço de eventos, um de cada vez, então
+    as baixas de estoque de caixas diferentes nunca se intercalam; só o
+    servidor grava nos arquivos (ou no banco). Cada alteração do catálogo
+    (cadastro, exclusão ou baixa de estoque) recebe uma versão, e os caixas
+    pedem as 'alteracoes' desde a última versão que receberam.
+    """
+
+    def __init__(self, host=SERVIDOR_PDV_HOST, porta=SERVIDOR_PDV_PORTA):
+        self.host = host
+        self.porta = porta
+        self.versao = 0
+        self._versoes = {} # código -> versão da sua última alteração, da mais antiga para a mais recente
+        self.operacoes = {
+            'produtos': lambda: produtos.registros(),
+            'vendas': lambda data_inicio=None, data_fim=None: historico_vendas.periodo(data_inicio, data_fim),
+            'vendas_marcadas': lambda data_inicio=None, data_fim=None: {
+                'vendas': historico_vendas.periodo(data_inicio, data_fim), 'registradas': armazenamento.registradas},
+            'buscar': lambda codigo: produtos.buscar(codigo),
+            'alteracoes': self._alteracoes,
+            'salvar_produto': self._salvar_produto,
+            'salvar_produtos': self._salvar_produtos,
+            'excluir_produto': self._excluir_produto,
+            'registrar_vendas': self._registrar_vendas,
+        }
+
+    async def executar(self):
+        servidor = await asyncio.start_server(self._atender, self.host, self.porta, limit=2 ** 26)
+        async with servidor:
+            await servidor.serve_forever()
+
+    async def _atender(self, reader, writer):
+        try:
+            while linha := await reader.readline():
+                writer.write(_codificar_mensagem(self._processar(linha)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @medir_tempo
+    def _processar(self, linha):
+        try:
+            pedido = json.loads(linha)
+            operacao = self.operacoes[pedido.pop('op')]
+            return {'ok': True, 'resultado': operacao(**pedido)}
+        except ErroCheckout as e:
+            return {'ok': False, 'tipo': type(e).__name__, 'erro': str(e)}
+        except Exception as e: # Um pedido inválido não derruba o servidor nem os outros caixas
+            return {'ok': False, 'tipo': type(e).__name__, 'erro': f"Pedido inválido ou falha no servidor: {e}"}
+
+    def _alterados(self, codigos):
+        """Dá uma nova versão aos códigos alterados (ou excluídos)."""
+        self.versao += 1
+        for codigo in codigos:
+            codigo = normalizar_codigo(codigo)
+            self._versoes.pop(codigo, None) # Reinserido no fim: a ordem do dicionário é a das versões
+            self._versoes[codigo] = self.versao
+
+    def _alteracoes(self, desde=None):
+        """Produtos alterados e códigos excluídos depois da versão 'desde' (None: o catálogo inteiro)."""
+        if desde is None:
+            return {'versao': self.versao, 'produtos': produtos.registros(), 'removidos': []}
+        alterados, removidos = [], []
+        for codigo, versao in reversed(self._versoes.items()):
+            if versao <= desde:
+                break
+            produto = produtos.buscar(codigo)
+            if produto is None:
+                removidos.append(codigo)
+            else:
+                alterados.append(produto)
+        return {'versao': self.versao, 'produtos': alterados, 'removidos': removidos}
 
-def excluir_produto_logica(codigo):
-    """Remove um produto do estoque."""
-    global produtos
-    produtos_originais = len(produtos)
-    produtos = [p for p in produtos if p['codigo'].upper() != codigo.upper()]
-    if len(produtos) < produtos_originais:
-        salvar_dados(produtos, PRODUTOS_FILE)
-        return True
-    return False
+    def _salvar_produto(self, produto):
+        anterior = produtos.buscar(produto['codigo'])
+        produtos.inserir_ou_atualizar(produto)
+        try:
+            armazenamento.salvar_produto(produtos, produto)
+        except Exception:
+            self._desfazer([(produto['codigo'], anterior)]) # O catálogo do servidor não diverge do que foi gravado
+            raise
+        self._alterados([produto['codigo']])
+
+    def _salvar_produtos(self, lista_produtos):
+        anteriores = produtos.inserir_ou_atualizar_lote(lista_produtos)
+        try:
+            armazenamento.salvar_produtos(produtos, lista_produtos)
+        except Exception:
+            self._desfazer([(produto['codigo'], anterior) for produto, anterior in zip(lista_produtos, anteriores)])
+            raise
+        self._alterados([produto['codigo'] for produto in lista_produtos])
+
+    def _excluir_produto(self, codigo):
+        anterior = produtos.buscar(codigo)
+        existia = produtos.remover(codigo)
+        if existia:
+            try:
+                armazenamento.excluir_produto(produtos, codigo)
+            except Exception:
+                self._desfazer([(codigo, anterior)])
+                raise
+            self._alterados([codigo])
+        return existia
+
+    @staticmethod
+    def _desfazer(substituidos):
+        """Volta ao catálogo os registros anteriores (None: o código não existia), do último para o primeiro."""
+        for codigo, anterior in reversed(substituidos):
+            if anterior is None:
+                produtos.remover(codigo)
+            else:
+                produtos.inserir_ou_atualizar(anterior)
+
+    def _registrar_vendas(self, carrinhos):
+        vendas_concluidas, rejeitados = motor_checkout.finalizar_lote(carrinhos, atomico=True)
+        codigos = {normalizar_codigo(item['codigo']) for carrinho in carrinhos for item in carrinho['itens']}
+        if vendas_concluidas:
+            self._alterados({item['codigo'] for venda in vendas_concluidas for item in venda['itens']})
+        return {
+            'vendas': vendas_concluidas,
+            'rejeitados': [[indice, type(erro).__name__, str(erro)] for indice, erro in rejeitados],
+            'registradas': armazenamento.registradas, # Marca deste lote, comparável à de 'vendas_marcadas'
+            'produtos': [produtos.buscar(codigo) for codigo in codigos if codigo in produtos], # Estoque atual, para o caixa se sincronizar
+        }
+
+class ClientePDV:
+    """Conexão síncrona de um caixa com o servidor PDV."""
+
+    def __init__(self, host=SERVIDOR_PDV_HOST, porta=SERVIDOR_PDV_PORTA):
+        try:
+            self._socket = socket.create_connection((host, porta))
+        except OSError as e:
+            raise ErroServidorPDV(f"Não foi possível conectar ao servidor PDV em {host}:{porta}: {e}") from e
+        self._arquivo = self._socket.makefile('rb')
+        self._lock = threading.Lock()
+
+    @medir_tempo
+    def chamar(self, op, **parametros):
+        """Envia um pedido e retorna o resultado; erros do servidor são levantados como exceções."""
+        with self._lock:
+            try:
+                self._socket.sendall(_codificar_mensagem({'op': op, **parametros}))
+                linha = self._arquivo.readline()
+            except OSError as e:
+                raise ErroServidorPDV(f"Falha na comunicação com o servidor PDV: {e}") from e
+        if not linha:
+            raise ErroServidorPDV("A conexão com o servidor PDV foi encerrada.")
+        resposta = json.loads(linha)
+        if not resposta['ok']:
+            raise ERROS_CHECKOUT.get(resposta['tipo'], ErroServidorPDV)(resposta['erro'])
+        return resposta['resultado']
+
+    def fechar(self):
+        self._arquivo.close()
+        self._socket.close()
 
 # --- Interface Gráfica Tkinter ---
 
+class ListaProdutosVirtual(tk.Frame):
+    """Lista de produtos em um ttk.Treeview que só materializa as linhas visíveis.
+
+    O Treeview tem apenas tantas linhas quanto cabem na área visível; a barra
+    de rolagem controla qual trecho do catálogo elas exibem. Assim, o custo de
+    desenhar a lista não depende do número de produtos cadastrados.
+    """
+
+    COLUNAS = (('codigo', "Código", 90), ('nome', "Nome", 200), ('preco', "Preço", 80), ('estoque', "Estoque", 70))
+
+    def __init__(self, master, catalogo, **kwargs):
+        super().__init__(master, **kwargs)
+        self.catalogo = catalogo
+        self._codigos = []   # Códigos na ordem de exibição
+        self._posicao = {}   # Código -> índice em _codigos
+        self._inicio = 0     # Índice do primeiro produto visível
+        self._linhas = 1     # Quantidade de linhas que cabem na área visível
+
+        self.tree = ttk.Treeview(self, columns=[c[0] for c in self.COLUNAS], show="headings", selectmode="browse")
+        for coluna, titulo, largura in self.COLUNAS:
+            self.tree.heading(coluna, text=titulo)
+            self.tree.column(coluna, width=largura, anchor="w" if coluna in ('codigo', 'nome') else "e")
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._rolar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<Configure>", self._ao_redimensionar)
+        self.tree.bind("<MouseWheel>", lambda event: self._rolar('scroll', -1 if event.delta > 0 else 1, 'units'))
+        self.tree.bind("<Button-4>", lambda event: self._rolar('scroll', -1, 'units')) # Roda do mouse no X11
+        self.tree.bind("<Button-5>", lambda event: self._rolar('scroll', 1, 'units'))
+
+    @medir_tempo
+    def recarregar(self):
+        """Sincroniza a lista inteira com o catálogo (apenas índices; só as linhas visíveis são redesenhadas)."""
+        self._codigos = self.catalogo.codigos()
+        self._posicao = {codigo: i for i, codigo in enumerate(self._codigos)}
+        self._desenhar()
+
+    @medir_tempo
+    def atualizar_produtos(self, codigos):
+        """Atualiza apenas os produtos informados: incluídos, alterados ou excluídos."""
+        redesenhar = False
+        for codigo in codigos:
+            codigo = normalizar_codigo(codigo)
+            no_catalogo = codigo in self.catalogo
+            if codigo in self._posicao and not no_catalogo:
+                indice = self._posicao.pop(codigo)
+                del self._codigos[indice]
+                for i in range(indice, len(self._codigos)):
+                    self._posicao[self._codigos[i]] = i
+                redesenhar = True
+            elif no_catalogo and codigo not in self._posicao:
+                self._posicao[codigo] = len(self._codigos)
+                self._codigos.append(codigo)
+                redesenhar = True
+            elif no_catalogo and self._inicio <= self._posicao[codigo] < self._inicio + self._linhas:
+                self.tree.item(f"linha{self._posicao[codigo] - self._inicio}", values=self._valores(codigo))
+        if redesenhar:
+            self._desenhar()
+
+    def _valores(self, codigo):
+        produto = self.catalogo.buscar(codigo)
+        return (produto['codigo'], produto['nome'], f"R$ {produto['preco']:.2f}", produto['estoque'])
+
+    @medir_tempo
+    def _desenhar(self):
+        total = len(self._codigos)
+        self._inicio = max(0, min(self._inicio, total - self._linhas))
+        if not total:
+            valores_linhas = [("", "Nenhum produto cadastrado.", "", "")]
+        else:
+            valores_linhas = [self._valores(codigo) for codigo in self._codigos[self._inicio:self._inicio + self._linhas]]
+
+        existentes = self.tree.get_children()
+        for i, valores in enumerate(valores_linhas):
+            if i < len(existentes):
+                self.tree.item(existentes[i], values=valores)
+            else:
+                self.tree.insert("", tk.END, iid=f"linha{i}", values=valores)
+        if len(existentes) > len(valores_linhas):
+            self.tree.delete(*existentes[len(valores_linhas):])
+
+        if total:
+            self.scrollbar.set(self._inicio / total, min(1.0, (self._inicio + self._linhas) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _rolar(self, acao, quantidade, unidade=None):
+        if acao == 'moveto':
+            self._inicio = int(float(quantidade) * len(self._codigos))
+        elif acao == 'scroll':
+            passo = self._linhas if unidade == 'pages' else 1
+            self._inicio += int(quantidade) * passo
+        self._desenhar()
+
+    def _ao_redimensionar(self, event):
+        filhos = self.tree.get_children()
+        caixa = self.tree.bbox(filhos[0]) if filhos else None
+        if caixa: # (x, y, largura, altura) da primeira linha: y é a altura do cabeçalho
+            cabecalho, altura_linha = caixa[1], caixa[3]
+        else:
+            cabecalho, altura_linha = 25, int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        linhas = max(1, (event.height - cabecalho) // max(1, altura_linha))
+        if linhas != self._linhas:
+            self._linhas = linhas
+            self._desenhar()
+
+class AutocompletarProdutos:
+    """Sugestões de produtos em uma lista sob um campo de texto, enquanto se digita.
+
+    A pesquisa é agendada com after_idle a cada tecla, de modo que uma
+    rajada de teclas já enfileiradas gera uma única pesquisa. As setas
+    escolhem a sugestão, Enter ou clique duplo confirmam e Esc fecha a lista.
+    Os atalhos usam uma tag própria na frente das do campo, para que Enter
+    sobre uma sugestão não dispare também o Enter do campo.
+    """
+
+    def __init__(self, entry, ao_escolher, pesquisar=None, ativo=None, limite=AUTOCOMPLETAR_LIMITE):
+        self.entry = entry
+        self.ao_escolher = ao_escolher # Chamada com o produto escolhido
+        self.pesquisar = pesquisar or pesquisar_produtos
+        self.ativo = ativo             # Função que desliga as sugestões quando retorna falso
+        self.limite = limite
+        self.sugestoes = []
+        self.agendamento = None
+        self.visivel = False
+
+        self.janela = tk.Toplevel(entry)
+        self.janela.withdraw()
+        self.janela.overrideredirect(True)
+        self.lista = tk.Listbox(self.janela, height=limite, font=("Arial", 10), activestyle="dotbox")
+        self.lista.pack(fill=tk.BOTH, expand=True)
+        self.lista.bind("<Double-Button-1>", lambda event: self.escolher())
+        self.lista.bind("<Return>", lambda event: self.escolher())
+        self.lista.bind("<Escape>", lambda event: self.esconder())
+
+        tag = f"autocompletar{id(self)}"
+        entry.bindtags((tag,) + entry.bindtags())
+        entry.bind_class(tag, "<KeyRelease>", self._ao_soltar_tecla)
+        entry.bind_class(tag, "<Down>", lambda event: self.mover(1))
+        entry.bind_class(tag, "<Up>", lambda event: self.mover(-1))
+        entry.bind_class(tag, "<Return>", lambda event: self.escolher() if self.lista.curselection() else None)
+        entry.bind_class(tag, "<Escape>", lambda event: self.esconder())
+        entry.bind_class(tag, "<FocusOut>", lambda event: entry.after(100, self._ao_perder_foco))
+
+    def _ao_soltar_tecla(self, event):
+        if event.keysym in ('Up', 'Down', 'Return', 'KP_Enter', 'Escape', 'Tab'):
+            return
+        if self.agendamento is None:
+            self.agendamento = self.entry.after_idle(self.atualizar)
+
+    def _ao_perder_foco(self):
+        if self.entry.focus_get() not in (self.entry, self.lista):
+            self.esconder()
+
+    @medir_tempo
+    def atualizar(self):
+        """Pesquisa o texto atual do campo e mostra as sugestões."""
+        self.agendamento = None
+        texto = self.entry.get().strip()
+        if len(texto) < AUTOCOMPLETAR_MINIMO_CARACTERES or (self.ativo and not self.ativo()):
+            self.esconder()
+            return
+        self.sugestoes = self.pesquisar(texto, self.limite)
+        if not self.sugestoes:
+            self.esconder()
+            return
+        self.lista.delete(0, tk.END)
+        self.lista.insert(tk.END, *(f"{p['codigo']} - {p['nome']} (R$ {p['preco']:.2f}, {p['estoque']} un.)" for p in self.sugestoes))
+        self.lista.config(height=len(self.sugestoes))
+        largura = max(self.entry.winfo_width(), 400)
+        self.janela.geometry(f"{largura}x{self.lista.winfo_reqheight()}+{self.entry.winfo_rootx()}+{self.entry.winfo_rooty() + self.entry.winfo_height()}")
+        if not self.visivel:
+            self.janela.deiconify()
+            self.janela.lift()
+            self.visivel = True
+
+    def mover(self, passo):
+        """Move a sugestão selecionada com as setas."""
+        if not self.visivel:
+            return None
+        selecao = self.lista.curselection()
+        indice = min(max((selecao[0] + passo) if selecao else 0, 0), len(self.sugestoes) - 1)
+        self.lista.selection_clear(0, tk.END)
+        self.lista.selection_set(indice)
+        self.lista.activate(indice)
+        self.lista.see(indice)
+        return "break"
+
+    def escolher(self):
+        selecao = self.lista.curselection()
+        if not self.visivel or not selecao:
+            return None
+        produto = self.sugestoes[selecao[0]]
+        self.esconder()
+        self.entry.focus_set()
+        self.ao_escolher(produto)
+        return "break"
+
+    def esconder(self):
+        if self.visivel:
+            self.janela.withdraw()
+            self.visivel = False
+        self.lista.selection_clear(0, tk.END)
+
+class TarefaRelatorio:
+    """Consome os blocos de um relatório em uma thread, sem travar a interface.
+
+    A thread gera os blocos e os põe em uma fila limitada; a thread da
+    interface os retira a cada RELATORIO_INTERVALO_MS (com after()), até
+    RELATORIO_BLOCOS_POR_VEZ por vez, e passa o texto a 'ao_receber' e o
+    progresso a 'ao_progredir'. 'cancelar' interrompe a geração no bloco
+    seguinte; ao final, 'ao_terminar' recebe a tarefa, com 'cancelada' e
+    'erro' preenchidos. Sem 'ao_receber' (gravação em arquivo), os blocos
+    não passam pela fila: a thread os consome no seu ritmo e só o progresso
+    é levado à interface.
+    """
+
+    def __init__(self, widget, nome, blocos, ao_receber=None, ao_progredir=None, ao_terminar=None):
+        self.widget = widget
+        self.ao_receber = ao_receber
+        self.ao_progredir = ao_progredir
+        self.ao_terminar = ao_terminar
+        self.erro = None
+        self._progresso = None # Último progresso de uma gravação em arquivo, lido pela thread da interface
+        self._cancelar = threading.Event()
+        self._terminou = threading.Event()
+        self._fila = queue.Queue(maxsize=RELATORIO_FILA_BLOCOS)
+        threading.Thread(target=self._executar, args=(nome, blocos), name=f"relatorio-{nome}", daemon=True).start()
+        widget.after(RELATORIO_INTERVALO_MS, self._entregar)
+
+    @property
+    def cancelada(self):
+        return self._cancelar.is_set()
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    def _executar(self, nome, blocos):
+        try:
+            with Cronometro(nome):
+                for texto, _, progresso in blocos:
+                    if self._cancelar.is_set():
+                        break
+                    if self.ao_receber is None:
+                        self._progresso = progresso # Gravação em arquivo: não espera pelo ritmo da interface
+                        continue
+                    while not self._cancelar.is_set():
+                        try:
+                            self._fila.put((texto, progresso), timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass # A interface ainda está inserindo os blocos anteriores
+        except Exception as e: # Mostrado pela interface em 'ao_terminar'
+            self.erro = e
+        finally:
+            blocos.close() # Libera o que o gerador mantém aberto (por exemplo, o temporário de uma gravação cancelada)
+            self._terminou.set()
+
+    def _entregar(self):
+        terminou = self._terminou.is_set() # Lido antes de esvaziar a fila, para não perder os últimos blocos
+        textos, progresso = [], None
+        for _ in range(RELATORIO_BLOCOS_POR_VEZ):
+            try:
+                texto, progresso = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            textos.append(texto)
+        if self.ao_receber is None:
+            progresso = self._progresso
+        if not self.cancelada:
+            if textos and self.ao_receber:
+                self.ao_receber(''.join(textos))
+            if progresso is not None and self.ao_progredir:
+                self.ao_progredir(progresso)
+        if terminou and self._fila.empty():
+            if self.ao_terminar:
+                self.ao_terminar(self)
+        else:
+            self.widget.after(RELATORIO_INTERVALO_MS, self._entregar)
+
 class SupermercadoApp:
     def __init__(self, master):
         self.master = master
@@ -133,8 +2648,19 @@ class SupermercadoApp:
         self.main_frame.grid_columnconfigure(1, weight=1)
         self.main_frame.grid_rowconfigure(0, weight=1)
 
+        self.carrinho = CarrinhoVenda()
+        self.leituras_scanner = [] # Códigos lidos pelo scanner ainda não incluídos no carrinho
+        self.linhas_carrinho_desenhadas = 0
+        self.agendamento_scanner = None
+        self.tarefa_relatorio = None # Relatório sendo gerado em segundo plano (um por vez)
+        self.leitura_vendas = None   # Leitura das vendas de um relatório de vendas, antes de ele começar a ser gerado
         self.create_widgets()
-        self.carrinho_itens = []
+        self.alertas_estoque = []
+        registrar_ouvinte_estoque_baixo(self.alertar_estoque_baixo)
+        master.protocol("WM_DELETE_WINDOW", self.ao_fechar) # Garante que as gravações pendentes terminem
+        if isinstance(armazenamento, ArmazenamentoRemoto):
+            master.after(CLIENTE_SINCRONIZAR_MS, self.sincronizar_catalogo_periodicamente)
+        self.aguardar_indice_nomes(produtos.iniciar_indice_nomes()) # Monta o índice da busca por nome em segundo plano, antes da primeira tecla
         self.atualizar_lista_produtos_gui() # Carrega produtos na lista ao iniciar
 
     def create_widgets(self):
@@ -161,19 +2687,27 @@ class SupermercadoApp:
         self.notebook.add(self.tab_relatorios, text="Relatórios")
         self.setup_relatorios_tab(self.tab_relatorios)
 
+        # Tab 4: Desempenho
+        self.tab_desempenho = tk.Frame(self.notebook, bg="#e0e0e0")
+        self.notebook.add(self.tab_desempenho, text="Desempenho")
+        self.setup_desempenho_tab(self.tab_desempenho)
+
         # --- Frame Direito: Lista de Produtos e Detalhes ---
         self.right_frame = tk.Frame(self.main_frame, bg="#d0d0d0", bd=2, relief="groove")
         self.right_frame.grid(row=0, column=1, padx=5, pady=5, sticky="nsew")
 
         tk.Label(self.right_frame, text="Produtos Cadastrados", font=("Arial", 14, "bold"), bg="#d0d0d0").pack(pady=10)
 
-        self.lista_produtos_scroll = scrolledtext.ScrolledText(self.right_frame, wrap=tk.WORD, width=50, height=25, font=("Arial", 10))
-        self.lista_produtos_scroll.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
-        self.lista_produtos_scroll.config(state=tk.DISABLED) # Torna o campo somente leitura
+        self.lista_produtos = ListaProdutosVirtual(self.right_frame, produtos)
+        self.lista_produtos.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
         # Botão para atualizar a lista de produtos
         tk.Button(self.right_frame, text="Atualizar Lista", command=self.atualizar_lista_produtos_gui, font=("Arial", 10)).pack(pady=5)
 
+        # Alertas de produtos que atingiram o estoque mínimo em uma venda
+        self.label_alerta_estoque = tk.Label(self.right_frame, text="", font=("Arial", 10, "bold"), bg="#d0d0d0", fg="red", justify=tk.LEFT, wraplength=400)
+        self.label_alerta_estoque.pack(pady=5)
+
 
     def setup_cadastro_tab(self, parent_frame):
         # Campos de entrada para cadastro/atualização
@@ -196,6 +2730,10 @@ class SupermercadoApp:
         self.entry_estoque = tk.Entry(form_frame, width=30)
         self.entry_estoque.grid(row=3, column=1, pady=5, padx=5)
 
+        tk.Label(form_frame, text="Estoque Mínimo (opcional):", bg="#e0e0e0").grid(row=4, column=0, pady=5, sticky="w")
+        self.entry_estoque_minimo = tk.Entry(form_frame, width=30)
+        self.entry_estoque_minimo.grid(row=4, column=1, pady=5, padx=5)
+
         # Botões de ação
         button_frame = tk.Frame(parent_frame, bg="#e0e0e0")
         button_frame.pack(pady=10)
@@ -203,11 +2741,14 @@ class SupermercadoApp:
         tk.Button(button_frame, text="Cadastrar/Atualizar Produto", command=self.acao_adicionar_ou_atualizar, font=("Arial", 10, "bold")).grid(row=0, column=0, padx=5)
         tk.Button(button_frame, text="Excluir Produto (pelo Código)", command=self.acao_excluir_produto, font=("Arial", 10)).grid(row=0, column=1, padx=5)
         tk.Button(button_frame, text="Limpar Campos", command=self.limpar_campos_cadastro, font=("Arial", 10)).grid(row=0, column=2, padx=5)
+        tk.Button(button_frame, text="Importar CSV...", command=self.acao_importar_csv, font=("Arial", 10)).grid(row=1, column=0, padx=5, pady=5)
+        tk.Button(button_frame, text="Exportar CSV...", command=self.acao_exportar_csv, font=("Arial", 10)).grid(row=1, column=1, padx=5, pady=5)
 
         # Campo para busca rápida no cadastro
-        tk.Label(parent_frame, text="Buscar Produto (pelo Código para preencher):", bg="#e0e0e0").pack(pady=5)
+        tk.Label(parent_frame, text="Buscar Produto (pelo Código ou Nome para preencher):", bg="#e0e0e0").pack(pady=5)
         self.entry_buscar_cadastro = tk.Entry(parent_frame, width=40)
         self.entry_buscar_cadastro.pack(pady=5)
+        self.autocompletar_cadastro = AutocompletarProdutos(self.entry_buscar_cadastro, self.escolher_produto_cadastro)
         tk.Button(parent_frame, text="Buscar", command=self.acao_buscar_para_preencher, font=("Arial", 10)).pack(pady=5)
 
 
@@ -219,7 +2760,10 @@ class SupermercadoApp:
         tk.Label(venda_input_frame, text="Código do Produto:", bg="#e0e0e0").grid(row=0, column=0, pady=5, sticky="w")
         self.entry_venda_codigo = tk.Entry(venda_input_frame, width=20)
         self.entry_venda_codigo.grid(row=0, column=1, pady=5, padx=5)
-        self.entry_venda_codigo.bind("<Return>", lambda event: self.acao_adicionar_ao_carrinho()) # Adiciona ao carrinho ao pressionar Enter
+        self.entry_venda_codigo.bind("<Return>", self.ao_enter_codigo_venda) # Adiciona ao carrinho ao pressionar Enter (ou ao ler um código no modo scanner)
+        # Sugestões por nome para quem não tem o código; desligadas no modo scanner, que só lê códigos
+        self.autocompletar_venda = AutocompletarProdutos(self.entry_venda_codigo, self.escolher_produto_venda,
+                                                         ativo=lambda: not self.modo_scanner.get())
 
         tk.Label(venda_input_frame, text="Quantidade:", bg="#e0e0e0").grid(row=1, column=0, pady=5, sticky="w")
         self.entry_venda_quantidade = tk.Entry(venda_input_frame, width=10)
@@ -228,12 +2772,19 @@ class SupermercadoApp:
         self.entry_venda_quantidade.bind("<Return>", lambda event: self.acao_adicionar_ao_carrinho()) # Adiciona ao carrinho ao pressionar Enter
 
 
-        tk.Button(venda_input_frame, text="Adicionar ao Carrinho", command=self.acao_adicionar_ao_carrinho, font=("Arial", 10, "bold")).grid(row=2, column=0, columnspan=2, pady=10)
+        # No modo scanner cada leitura entra no carrinho sem diálogos, com a quantidade acima
+        self.modo_scanner = tk.BooleanVar(value=False)
+        tk.Checkbutton(venda_input_frame, text="Modo Scanner", variable=self.modo_scanner, bg="#e0e0e0").grid(row=2, column=0, columnspan=2, pady=2)
+
+        tk.Button(venda_input_frame, text="Adicionar ao Carrinho", command=self.acao_adicionar_ao_carrinho, font=("Arial", 10, "bold")).grid(row=3, column=0, columnspan=2, pady=10)
+        self.label_status_scanner = tk.Label(venda_input_frame, text="", bg="#e0e0e0", fg="red")
+        self.label_status_scanner.grid(row=4, column=0, columnspan=2)
 
         # Lista do carrinho
         tk.Label(parent_frame, text="Carrinho de Compras", font=("Arial", 12, "bold"), bg="#e0e0e0").pack(pady=5)
         self.lista_carrinho = scrolledtext.ScrolledText(parent_frame, wrap=tk.WORD, width=40, height=10, font=("Arial", 10))
         self.lista_carrinho.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+        self.lista_carrinho.insert(tk.END, "Carrinho vazio.")
         self.lista_carrinho.config(state=tk.DISABLED)
 
         # Total da venda
@@ -248,6 +2799,17 @@ class SupermercadoApp:
 
 
     def setup_relatorios_tab(self, parent_frame):
+        # Progresso do relatório em geração (os relatórios são gerados em segundo plano e podem ser cancelados)
+        progresso_frame = tk.Frame(parent_frame, bg="#e0e0e0")
+        progresso_frame.pack(side=tk.BOTTOM, pady=5, padx=10, fill=tk.X)
+        self.progresso_relatorio = tk.DoubleVar(value=0.0)
+        ttk.Progressbar(progresso_frame, variable=self.progresso_relatorio, maximum=1.0, length=200).pack(side=tk.LEFT, padx=5)
+        self.label_status_relatorio = tk.Label(progresso_frame, text="", bg="#e0e0e0", font=("Arial", 9))
+        self.label_status_relatorio.pack(side=tk.LEFT, padx=5)
+        self.botao_cancelar_relatorio = tk.Button(progresso_frame, text="Cancelar", command=self.cancelar_relatorio,
+                                                  font=("Arial", 10), state=tk.DISABLED)
+        self.botao_cancelar_relatorio.pack(side=tk.RIGHT, padx=5)
+
         # Relatório de Estoque Baixo
         estoque_frame = tk.Frame(parent_frame, bg="#e0e0e0")
         estoque_frame.pack(pady=10, padx=10, fill=tk.X)
@@ -257,6 +2819,7 @@ class SupermercadoApp:
         self.entry_limite_estoque.pack(side=tk.LEFT, padx=5)
         self.entry_limite_estoque.insert(0, "5")
         tk.Button(estoque_frame, text="Gerar", command=self.acao_relatorio_estoque_baixo, font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
+        tk.Button(estoque_frame, text="Exportar...", command=self.acao_exportar_relatorio_estoque_baixo, font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
 
         self.text_relatorio_estoque = scrolledtext.ScrolledText(parent_frame, wrap=tk.WORD, width=60, height=10, font=("Arial", 10))
         self.text_relatorio_estoque.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
@@ -264,24 +2827,93 @@ class SupermercadoApp:
 
         tk.Frame(parent_frame, height=1, bg="gray").pack(fill=tk.X, pady=10) # Separador
 
-        # Relatório de Vendas do Dia
+        # Relatório de Vendas (período opcional)
         vendas_frame = tk.Frame(parent_frame, bg="#e0e0e0")
         vendas_frame.pack(pady=10, padx=10, fill=tk.X)
-        tk.Label(vendas_frame, text="Relatório de Vendas (Todas)", font=("Arial", 12, "bold"), bg="#e0e0e0").pack(pady=5)
-        tk.Button(vendas_frame, text="Gerar Relatório de Vendas", command=self.acao_relatorio_vendas, font=("Arial", 10)).pack(pady=5)
+        tk.Label(vendas_frame, text="Relatório de Vendas", font=("Arial", 12, "bold"), bg="#e0e0e0").pack(pady=5)
+        periodo_frame = tk.Frame(vendas_frame, bg="#e0e0e0")
+        periodo_frame.pack(pady=5)
+        tk.Label(periodo_frame, text="De (AAAA-MM-DD):", bg="#e0e0e0").pack(side=tk.LEFT, padx=5)
+        self.entry_data_inicio = tk.Entry(periodo_frame, width=12)
+        self.entry_data_inicio.pack(side=tk.LEFT, padx=5)
+        tk.Label(periodo_frame, text="Até:", bg="#e0e0e0").pack(side=tk.LEFT, padx=5)
+        self.entry_data_fim = tk.Entry(periodo_frame, width=12)
+        self.entry_data_fim.pack(side=tk.LEFT, padx=5)
+        tk.Label(vendas_frame, text="(deixe em branco para todo o período)", bg="#e0e0e0", font=("Arial", 8)).pack()
+        botoes_vendas_frame = tk.Frame(vendas_frame, bg="#e0e0e0")
+        botoes_vendas_frame.pack(pady=5)
+        tk.Button(botoes_vendas_frame, text="Gerar Relatório de Vendas", command=self.acao_relatorio_vendas, font=("Arial", 10)).grid(row=0, column=0, padx=5)
+        tk.Button(botoes_vendas_frame, text="Resumo do Período", command=self.acao_resumo_vendas, font=("Arial", 10)).grid(row=0, column=1, padx=5)
+        tk.Button(botoes_vendas_frame, text="Vendas de Hoje", command=self.acao_relatorio_vendas_hoje, font=("Arial", 10)).grid(row=0, column=2, padx=5)
+        tk.Button(botoes_vendas_frame, text="Exportar...", command=self.acao_exportar_relatorio_vendas, font=("Arial", 10)).grid(row=0, column=3, padx=5)
 
         self.text_relatorio_vendas = scrolledtext.ScrolledText(parent_frame, wrap=tk.WORD, width=60, height=10, font=("Arial", 10))
         self.text_relatorio_vendas.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
         self.text_relatorio_vendas.config(state=tk.DISABLED)
 
+        tk.Frame(parent_frame, height=1, bg="gray").pack(fill=tk.X, pady=10) # Separador
+
+        # Análise de Vendas (mais vendidos, receita por hora/dia da semana e cestas), no mesmo período acima
+        analise_frame = tk.Frame(parent_frame, bg="#e0e0e0")
+        analise_frame.pack(pady=5, padx=10, fill=tk.X)
+        tk.Label(analise_frame, text="Análise de Vendas", font=("Arial", 12, "bold"), bg="#e0e0e0").pack(side=tk.LEFT, padx=5)
+        tk.Button(analise_frame, text="Gerar Análise", command=self.acao_analise_vendas, font=("Arial", 10),
+                  state=tk.NORMAL if analise_vendas else tk.DISABLED).pack(side=tk.LEFT, padx=5)
+        if analise_vendas is None:
+            tk.Label(analise_frame, text="(requer NumPy)", bg="#e0e0e0", font=("Arial", 8)).pack(side=tk.LEFT)
+
+        self.text_analise_vendas = scrolledtext.ScrolledText(parent_frame, wrap=tk.WORD, width=60, height=10, font=("Courier", 10))
+        self.text_analise_vendas.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+        self.text_analise_vendas.config(state=tk.DISABLED)
+
+    def setup_desempenho_tab(self, parent_frame):
+        # Controles da medição
+        controles_frame = tk.Frame(parent_frame, bg="#e0e0e0")
+        controles_frame.pack(pady=10, padx=10, fill=tk.X)
+        tk.Label(controles_frame, text="Latência das Operações", font=("Arial", 12, "bold"), bg="#e0e0e0").pack(side=tk.LEFT, padx=5)
+        self.medir_desempenho = tk.BooleanVar(value=medidor_desempenho.ativo)
+        tk.Checkbutton(controles_frame, text="Medir", variable=self.medir_desempenho, bg="#e0e0e0",
+                       command=lambda: setattr(medidor_desempenho, 'ativo', self.medir_desempenho.get())).pack(side=tk.LEFT, padx=5)
+        tk.Button(controles_frame, text="Atualizar", command=self.atualizar_desempenho_gui, font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
+        tk.Button(controles_frame, text="Zerar", command=self.acao_zerar_desempenho, font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
+        tk.Button(controles_frame, text="Exportar...", command=self.acao_exportar_desempenho, font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
+
+        # Tabela com contagem e percentis (em ms) de cada operação medida
+        colunas = (('operacao', "Operação", 230), ('contagem', "Chamadas", 70), ('media', "Média", 70),
+                   ('p50', "p50", 70), ('p95', "p95", 70), ('p99', "p99", 70), ('max', "Máx.", 70))
+        tabela_frame = tk.Frame(parent_frame, bg="#e0e0e0")
+        tabela_frame.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+        self.tree_desempenho = ttk.Treeview(tabela_frame, columns=[c[0] for c in colunas], show="headings")
+        for coluna, titulo, largura in colunas:
+            self.tree_desempenho.heading(coluna, text=titulo)
+            self.tree_desempenho.column(coluna, width=largura, anchor="w" if coluna == 'operacao' else "e")
+        scrollbar = ttk.Scrollbar(tabela_frame, orient=tk.VERTICAL, command=self.tree_desempenho.yview)
+        self.tree_desempenho.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_desempenho.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tk.Label(parent_frame, text="Tempos em milissegundos. A tabela se atualiza sozinha enquanto esta aba está aberta.",
+                 bg="#e0e0e0", font=("Arial", 8)).pack(pady=5)
+        self.master.after(DESEMPENHO_ATUALIZAR_TELA_MS, self.atualizar_desempenho_periodicamente)
+
     # --- Métodos de Ação da GUI ---
 
+    def ao_fechar(self):
+        """Aguarda as gravações pendentes e fecha a janela."""
+        self.cancelar_relatorio()
+        try:
+            armazenamento.fechar()
+        except OSError as e:
+            if not messagebox.askyesno("Erro ao Gravar", f"Não foi possível gravar os dados: {e}\nFechar mesmo assim?"):
+                return
+        self.master.destroy()
+
     def limpar_campos_cadastro(self):
         """Limpa os campos de entrada do formulário de cadastro."""
         self.entry_codigo.delete(0, tk.END)
         self.entry_nome.delete(0, tk.END)
         self.entry_preco.delete(0, tk.END)
         self.entry_estoque.delete(0, tk.END)
+        self.entry_estoque_minimo.delete(0, tk.END)
         self.entry_buscar_cadastro.delete(0, tk.END)
 
     def acao_adicionar_ou_atualizar(self):
@@ -290,10 +2922,11 @@ class SupermercadoApp:
         nome = self.entry_nome.get().strip()
         preco_str = self.entry_preco.get().strip()
         estoque_str = self.entry_estoque.get().strip()
+        estoque_minimo_str = self.entry_estoque_minimo.get().strip()
 
-        if adicionar_ou_atualizar_produto(codigo, nome, preco_str, estoque_str):
+        if adicionar_ou_atualizar_produto(codigo, nome, preco_str, estoque_str, estoque_minimo_str):
             self.limpar_campos_cadastro()
-            self.atualizar_lista_produtos_gui()
+            self.atualizar_lista_produtos_gui([codigo])
 
     def acao_excluir_produto(self):
         """Chama a função de negócio para excluir e atualiza a GUI."""
@@ -303,50 +2936,128 @@ class SupermercadoApp:
             return
 
         if messagebox.askyesno("Confirmação", f"Tem certeza que deseja excluir o produto com código '{codigo}'?"):
-            if excluir_produto_logica(codigo):
+            excluido = excluir_produto_logica(codigo)
+            if excluido:
                 messagebox.showinfo("Sucesso", f"Produto com código '{codigo}' excluído com sucesso!")
                 self.limpar_campos_cadastro()
-                self.atualizar_lista_produtos_gui()
-            else:
+                self.atualizar_lista_produtos_gui([codigo])
+            elif excluido is False: # None: a falha na gravação já foi mostrada
                 messagebox.showerror("Erro", f"Produto com código '{codigo}' não encontrado.")
 
     def acao_buscar_para_preencher(self):
-        """Busca um produto e preenche os campos de cadastro para edição."""
+        """Busca um produto (pelo código ou, se não houver, pelo nome) e preenche os campos de cadastro para edição."""
         codigo_busca = self.entry_buscar_cadastro.get().strip()
         if not codigo_busca:
-            messagebox.showwarning("Aviso", "Digite o código do produto para buscar.")
+            messagebox.showwarning("Aviso", "Digite o código ou o nome do produto para buscar.")
             return
 
-        produto_encontrado = buscar_produto_por_codigo(codigo_busca)
-        if produto_encontrado:
-            self.entry_codigo.delete(0, tk.END)
-            self.entry_codigo.insert(0, produto_encontrado['codigo'])
-            self.entry_nome.delete(0, tk.END)
-            self.entry_nome.insert(0, produto_encontrado['nome'])
-            self.entry_preco.delete(0, tk.END)
-            self.entry_preco.insert(0, str(produto_encontrado['preco']))
-            self.entry_estoque.delete(0, tk.END)
-            self.entry_estoque.insert(0, str(produto_encontrado['estoque']))
+        encontrados = pesquisar_produtos(codigo_busca, 1)
+        if encontrados:
+            produto_encontrado = encontrados[0]
+            self.preencher_campos_cadastro(produto_encontrado)
             messagebox.showinfo("Produto Encontrado", f"Dados do produto '{produto_encontrado['nome']}' carregados para edição.")
         else:
-            messagebox.showerror("Não Encontrado", f"Produto com código '{codigo_busca}' não encontrado.")
+            messagebox.showerror("Não Encontrado", f"Produto '{codigo_busca}' não encontrado.")
             self.limpar_campos_cadastro()
 
+    def acao_importar_csv(self):
+        """Importa produtos de um CSV e mostra um único resumo com as linhas rejeitadas."""
+        caminho = filedialog.askopenfilename(title="Importar produtos", filetypes=[("CSV", "*.csv"), ("Todos os arquivos", "*.*")])
+        if not caminho:
+            return
+        self.master.config(cursor="watch")
+        self.master.update_idletasks()
+        try:
+            resultado = importar_produtos_csv(caminho)
+        except (OSError, ValueError, csv.Error, ErroServidorPDV) as e:
+            messagebox.showerror("Erro na Importação", f"Não foi possível importar '{caminho}': {e}")
+            return
+        finally:
+            self.master.config(cursor="")
+        self.atualizar_lista_produtos_gui()
+        messagebox.showinfo("Importação Concluída", resumo_importacao(resultado, maximo_rejeitados=15))
+
+    def acao_exportar_csv(self):
+        """Exporta o catálogo para um CSV."""
+        caminho = filedialog.asksaveasfilename(title="Exportar produtos", defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if not caminho:
+            return
+        try:
+            total = exportar_produtos_csv(caminho)
+        except OSError as e:
+            messagebox.showerror("Erro na Exportação", f"Não foi possível gravar '{caminho}': {e}")
+            return
+        messagebox.showinfo("Exportação Concluída", f"{total} produto(s) exportado(s) para '{caminho}'.")
+
+    def preencher_campos_cadastro(self, produto):
+        """Preenche os campos de cadastro com os dados do produto."""
+        self.entry_codigo.delete(0, tk.END)
+        self.entry_codigo.insert(0, produto['codigo'])
+        self.entry_nome.delete(0, tk.END)
+        self.entry_nome.insert(0, produto['nome'])
+        self.entry_preco.delete(0, tk.END)
+        self.entry_preco.insert(0, str(produto['preco']))
+        self.entry_estoque.delete(0, tk.END)
+        self.entry_estoque.insert(0, str(produto['estoque']))
+        self.entry_estoque_minimo.delete(0, tk.END)
+        self.entry_estoque_minimo.insert(0, str(produto.get('estoque_minimo', '')))
+
+    def escolher_produto_cadastro(self, produto):
+        """Sugestão escolhida na busca do cadastro: preenche os campos sem diálogo."""
+        self.entry_buscar_cadastro.delete(0, tk.END)
+        self.entry_buscar_cadastro.insert(0, produto['codigo'])
+        self.preencher_campos_cadastro(produto)
+
+    def escolher_produto_venda(self, produto):
+        """Sugestão escolhida no código da venda: adiciona o produto ao carrinho."""
+        self.entry_venda_codigo.delete(0, tk.END)
+        self.entry_venda_codigo.insert(0, produto['codigo'])
+        self.acao_adicionar_ao_carrinho()
+
+    def sincronizar_catalogo(self):
+        """Caixa cliente: aplica os produtos cadastrados, alterados ou excluídos no servidor e atualiza a lista."""
+        try:
+            codigos = armazenamento.sincronizar_catalogo(produtos)
+        except (ErroServidorPDV, OSError) as e: # Tenta de novo na próxima sincronização
+            print(f"Erro ao sincronizar o catálogo com o servidor PDV: {e}", file=sys.stderr)
+            return
+        if codigos:
+            self.atualizar_lista_produtos_gui(codigos)
+
+    def sincronizar_catalogo_periodicamente(self):
+        self.sincronizar_catalogo()
+        self.master.after(CLIENTE_SINCRONIZAR_MS, self.sincronizar_catalogo_periodicamente)
+
+    def aguardar_indice_nomes(self, construcao):
+        """Passa a usar o índice de nomes montado em segundo plano assim que ele ficar pronto."""
+        if construcao is not None and not produtos.concluir_indice_nomes(construcao):
+            self.master.after(INDICE_NOMES_VERIFICAR_MS, self.aguardar_indice_nomes, construcao)
+
 
-    def atualizar_lista_produtos_gui(self):
-        """Atualiza o widget ScrolledText com a lista atual de produtos."""
-        self.lista_produtos_scroll.config(state=tk.NORMAL)
-        self.lista_produtos_scroll.delete('1.0', tk.END)
-        if not produtos:
-            self.lista_produtos_scroll.insert(tk.END, "Nenhum produto cadastrado.")
+    def atualizar_lista_produtos_gui(self, codigos=None):
+        """Atualiza a lista de produtos: inteira, ou apenas os códigos informados."""
+        if codigos is None:
+            self.lista_produtos.recarregar()
         else:
-            for produto in produtos:
-                self.lista_produtos_scroll.insert(tk.END, f"Código: {produto['codigo']}\n")
-                self.lista_produtos_scroll.insert(tk.END, f"Nome: {produto['nome']}\n")
-                self.lista_produtos_scroll.insert(tk.END, f"Preço: R$ {produto['preco']:.2f}\n")
-                self.lista_produtos_scroll.insert(tk.END, f"Estoque: {produto['estoque']}\n")
-                self.lista_produtos_scroll.insert(tk.END, "-" * 30 + "\n")
-        self.lista_produtos_scroll.config(state=tk.DISABLED)
+            self.lista_produtos.atualizar_produtos(codigos)
+
+    def alertar_estoque_baixo(self, produto):
+        """Mostra o alerta de um produto que atingiu o estoque mínimo em uma venda."""
+        self.alertas_estoque.append(f"Estoque baixo: {produto['nome']} ({produto['codigo']}) - {produto['estoque']} un. (mínimo {produto['estoque_minimo']})")
+        del self.alertas_estoque[:-5] # Mantém apenas os alertas mais recentes
+        self.label_alerta_estoque.config(text="\n".join(self.alertas_estoque))
+
+    def validar_item_carrinho(self, codigo, quantidade):
+        """Retorna (produto, None) se a quantidade pode entrar no carrinho, ou (None, (título, mensagem))."""
+        try:
+            produto = buscar_produto_por_codigo(codigo)
+        except (ErroServidorPDV, OSError) as e:
+            return None, ("Erro de Conexão", f"Não foi possível consultar o servidor PDV: {e}")
+        if not produto:
+            return None, ("Produto Não Encontrado", f"Produto com código '{codigo}' não encontrado.")
+        if produto['estoque'] < self.carrinho.quantidade(codigo) + quantidade:
+            return None, ("Estoque Insuficiente", f"Estoque insuficiente para '{produto['nome']}'. Disponível: {produto['estoque']}")
+        return produto, None
 
     def acao_adicionar_ao_carrinho(self):
         """Adiciona um item ao carrinho de vendas."""
@@ -366,132 +3077,467 @@ class SupermercadoApp:
             messagebox.showerror("Erro de Entrada", "Quantidade inválida. Digite um número inteiro.")
             return
 
-        produto = buscar_produto_por_codigo(codigo)
-        if not produto:
-            messagebox.showerror("Produto Não Encontrado", f"Produto com código '{codigo}' não encontrado.")
-            return
-        
-        if produto['estoque'] < quantidade:
-            messagebox.showwarning("Estoque Insuficiente", f"Estoque insuficiente para '{produto['nome']}'. Disponível: {produto['estoque']}")
+        produto, erro = self.validar_item_carrinho(codigo, quantidade)
+        if erro:
+            messagebox.showwarning(*erro)
             return
 
-        # Verifica se o item já está no carrinho para somar a quantidade
-        item_no_carrinho = False
-        for item in self.carrinho_itens:
-            if item['codigo'] == codigo:
-                item['quantidade'] += quantidade
-                item_no_carrinho = True
-                break
-        
-        if not item_no_carrinho:
-            self.carrinho_itens.append({'codigo': codigo, 'quantidade': quantidade, 'nome': produto['nome'], 'preco_unitario': produto['preco']})
-        
-        self.atualizar_carrinho_gui()
+        item, _ = self.carrinho.adicionar(produto, quantidade) # Soma a quantidade se o item já estiver no carrinho
+        self.atualizar_carrinho_gui([item])
         self.entry_venda_codigo.delete(0, tk.END)
         self.entry_venda_quantidade.delete(0, tk.END)
         self.entry_venda_quantidade.insert(0, "1") # Reseta para 1 após adicionar
 
-    def atualizar_carrinho_gui(self):
-        """Atualiza a lista do carrinho e o total na GUI."""
-        self.lista_carrinho.config(state=tk.NORMAL)
-        self.lista_carrinho.delete('1.0', tk.END)
-        total_atual = 0.0
+    def ao_enter_codigo_venda(self, event=None):
+        """Enter no código: adiciona o item, ou no modo scanner guarda a leitura para incluir junto com as seguintes."""
+        if not self.modo_scanner.get():
+            self.acao_adicionar_ao_carrinho()
+            return
+        codigo = self.entry_venda_codigo.get().strip().upper()
+        self.entry_venda_codigo.delete(0, tk.END) # Libera o campo para a próxima leitura
+        if codigo:
+            self.leituras_scanner.append(codigo)
+            if self.agendamento_scanner is None:
+                self.agendamento_scanner = self.master.after(SCANNER_INTERVALO_MS, self.processar_leituras_scanner)
+        return "break"
+
+    @medir_tempo
+    def processar_leituras_scanner(self):
+        """Inclui no carrinho as leituras acumuladas, redesenhando só as linhas alteradas e o total."""
+        if self.agendamento_scanner is not None:
+            self.master.after_cancel(self.agendamento_scanner)
+            self.agendamento_scanner = None
+        leituras, self.leituras_scanner = self.leituras_scanner, []
+        if not leituras:
+            return
+        try:
+            quantidade = int(self.entry_venda_quantidade.get().strip())
+            if quantidade <= 0:
+                raise ValueError
+        except ValueError:
+            self.label_status_scanner.config(text=f"Quantidade inválida; {len(leituras)} leitura(s) descartada(s).")
+            self.master.bell()
+            return
 
-        if not self.carrinho_itens:
-            self.lista_carrinho.insert(tk.END, "Carrinho vazio.")
+        por_codigo = {}
+        for codigo in leituras:
+            por_codigo[codigo] = por_codigo.get(codigo, 0) + quantidade
+        alterados, erros = [], []
+        for codigo, quantidade_total in por_codigo.items():
+            produto, erro = self.validar_item_carrinho(codigo, quantidade_total)
+            if erro:
+                erros.append(erro[1])
+                continue
+            item, _ = self.carrinho.adicionar(produto, quantidade_total)
+            alterados.append(item)
+        if alterados:
+            self.atualizar_carrinho_gui(alterados)
+        # Erros não abrem diálogos, que travariam as próximas leituras
+        self.label_status_scanner.config(text="\n".join(erros[-3:]))
+        if erros:
+            self.master.bell()
+
+    @medir_tempo
+    def atualizar_carrinho_gui(self, alterados=None):
+        """Atualiza a lista do carrinho e o total na GUI: inteira, ou só as linhas dos itens informados."""
+        self.lista_carrinho.config(state=tk.NORMAL)
+        desenhados = self.linhas_carrinho_desenhadas if alterados is not None else 0
+        if not desenhados:
+            # Carrinho redesenhado por inteiro: linhas dos itens, separador e total
+            self.lista_carrinho.delete('1.0', tk.END)
+            itens = self.carrinho.itens()
+            if not itens:
+                self.lista_carrinho.insert(tk.END, "Carrinho vazio.")
+            else:
+                self.lista_carrinho.insert(tk.END, "".join(self.texto_item_carrinho(item) + "\n" for item in itens))
+                self.lista_carrinho.insert(tk.END, "-" * 30 + "\n")
+                self.lista_carrinho.insert(tk.END, f"Total do Carrinho: R$ {self.carrinho.total:.2f}\n")
+            self.linhas_carrinho_desenhadas = len(itens)
         else:
-            for item in self.carrinho_itens:
-                subtotal = item['quantidade'] * item['preco_unitario']
-                total_atual += subtotal
-                self.lista_carrinho.insert(tk.END, f"{item['nome']} ({item['quantidade']}x) - R$ {subtotal:.2f}\n")
-            self.lista_carrinho.insert(tk.END, "-" * 30 + "\n")
-            self.lista_carrinho.insert(tk.END, f"Total do Carrinho: R$ {total_atual:.2f}\n")
+            # Cada item ocupa a linha 'posicao' + 1; itens novos entram antes do separador
+            linha = 1
+            for item in sorted(alterados, key=lambda item: item['posicao']):
+                linha = item['posicao'] + 1
+                if item['posicao'] < desenhados:
+                    self.lista_carrinho.delete(f"{linha}.0", f"{linha}.end")
+                    self.lista_carrinho.insert(f"{linha}.0", self.texto_item_carrinho(item))
+                else:
+                    self.lista_carrinho.insert(f"{linha}.0", self.texto_item_carrinho(item) + "\n")
+                    desenhados += 1
+            self.linhas_carrinho_desenhadas = desenhados
+            linha_total = desenhados + 2
+            self.lista_carrinho.delete(f"{linha_total}.0", f"{linha_total}.end")
+            self.lista_carrinho.insert(f"{linha_total}.0", f"Total do Carrinho: R$ {self.carrinho.total:.2f}")
+            self.lista_carrinho.see(f"{linha}.0")
 
         self.lista_carrinho.config(state=tk.DISABLED)
-        self.label_total_venda.config(text=f"Total: R$ {total_atual:.2f}")
+        self.label_total_venda.config(text=f"Total: R$ {self.carrinho.total:.2f}")
+
+    def texto_item_carrinho(self, item):
+        subtotal = item['quantidade'] * item['preco_unitario']
+        return f"{item['nome']} ({item['quantidade']}x) - R$ {subtotal:.2f}"
 
     def limpar_carrinho_gui(self):
         """Limpa o carrinho na GUI e na lógica."""
-        self.carrinho_itens = []
+        self.leituras_scanner = []
+        self.carrinho.limpar()
         self.atualizar_carrinho_gui()
         messagebox.showinfo("Carrinho Limpo", "O carrinho foi esvaziado.")
 
     def acao_finalizar_venda(self):
         """Finaliza a venda, atualiza estoque e registra a venda."""
-        if not self.carrinho_itens:
+        self.processar_leituras_scanner() # Inclui as leituras que ainda aguardam o intervalo do scanner
+        if not self.carrinho:
             messagebox.showwarning("Carrinho Vazio", "Adicione itens ao carrinho antes de finalizar a venda.")
             return
 
         if messagebox.askyesno("Confirmação de Venda", "Deseja finalizar esta venda?"):
-            sucesso, total_arrecadado = realizar_venda_logica(self.carrinho_itens)
+            sucesso, total_arrecadado = realizar_venda_logica(self.carrinho.itens())
             if sucesso:
                 messagebox.showinfo("Venda Concluída", f"Venda realizada com sucesso! Total: R$ {total_arrecadado:.2f}")
-                self.carrinho_itens = [] # Limpa o carrinho após a venda
+                codigos_vendidos = [item['codigo'] for item in self.carrinho.itens()]
+                self.carrinho.limpar() # Limpa o carrinho após a venda
                 self.atualizar_carrinho_gui()
-                self.atualizar_lista_produtos_gui() # Atualiza estoque visivelmente
+                self.atualizar_lista_produtos_gui(codigos_vendidos) # Atualiza estoque visivelmente
+                if isinstance(armazenamento, ArmazenamentoRemoto):
+                    self.sincronizar_catalogo() # Traz também o que os outros caixas alteraram
             else:
                 # A mensagem de erro específica já é mostrada por 'realizar_venda_logica'
                 pass
         else:
             messagebox.showinfo("Venda Cancelada", "A venda não foi finalizada.")
 
-    def acao_relatorio_estoque_baixo(self):
-        """Gera e exibe o relatório de estoque baixo."""
-        self.text_relatorio_estoque.config(state=tk.NORMAL)
-        self.text_relatorio_estoque.delete('1.0', tk.END)
-
+    def ler_limite_estoque(self):
+        """Lê o limite do relatório de estoque baixo. Retorna o número ou None se for inválido."""
         try:
             limite = int(self.entry_limite_estoque.get().strip())
-            if limite < 0:
-                messagebox.showerror("Erro", "O limite deve ser um número positivo ou zero.")
-                self.text_relatorio_estoque.insert(tk.END, "Limite inválido.")
-                self.text_relatorio_estoque.config(state=tk.DISABLED)
-                return
         except ValueError:
             messagebox.showerror("Erro", "Limite inválido. Digite um número inteiro.")
-            self.text_relatorio_estoque.insert(tk.END, "Limite inválido.")
-            self.text_relatorio_estoque.config(state=tk.DISABLED)
+            return None
+        if limite < 0:
+            messagebox.showerror("Erro", "O limite deve ser um número positivo ou zero.")
+            return None
+        return limite
+
+    def acao_relatorio_estoque_baixo(self):
+        """Gera e exibe o relatório de estoque baixo."""
+        limite = self.ler_limite_estoque()
+        if limite is None:
             return
+        self.iniciar_relatorio('relatorio_estoque_baixo', relatorio_estoque_baixo(retrato_estoque_baixo(limite), limite),
+                               widget=self.text_relatorio_estoque)
 
-        produtos_baixo_estoque = [p for p in produtos if p['estoque'] <= limite]
+    def acao_exportar_relatorio_estoque_baixo(self):
+        """Grava o relatório de estoque baixo em um arquivo TXT ou CSV."""
+        limite = self.ler_limite_estoque()
+        if limite is None:
+            return
+        caminho = self.pedir_arquivo_relatorio("Exportar relatório de estoque baixo")
+        if caminho:
+            self.iniciar_relatorio('relatorio_estoque_baixo', relatorio_estoque_baixo(retrato_estoque_baixo(limite), limite),
+                                   caminho=caminho)
+
+    def ler_periodo_relatorio(self):
+        """Lê as datas do período do relatório. Retorna (inicio, fim), com None para datas em branco, ou None se inválidas."""
+        datas = []
+        for entry in (self.entry_data_inicio, self.entry_data_fim):
+            texto = entry.get().strip()
+            if texto:
+                try:
+                    datetime.strptime(texto, "%Y-%m-%d")
+                except ValueError:
+                    messagebox.showerror("Erro", f"Data inválida: '{texto}'. Use o formato AAAA-MM-DD.")
+                    return None
+            datas.append(texto or None)
+        return tuple(datas)
 
-        if not produtos_baixo_estoque:
-            self.text_relatorio_estoque.insert(tk.END, f"Nenhum produto com estoque abaixo de {limite} unidades.\n")
+    def acao_relatorio_vendas(self):
+        """Gera e exibe o relatório das vendas do período (ou de todas)."""
+        periodo = self.ler_periodo_relatorio()
+        if periodo is None:
+            return
+        self.iniciar_relatorio_vendas(periodo, widget=self.text_relatorio_vendas)
+
+    def acao_exportar_relatorio_vendas(self):
+        """Grava o relatório das vendas do período (ou de todas) em um arquivo TXT ou CSV."""
+        periodo = self.ler_periodo_relatorio()
+        if periodo is None:
+            return
+        caminho = self.pedir_arquivo_relatorio("Exportar relatório de vendas")
+        if caminho:
+            self.iniciar_relatorio_vendas(periodo, caminho=caminho)
+
+    def iniciar_relatorio_vendas(self, periodo, widget=None, caminho=None):
+        """Gera o relatório de vendas; se o histórico não está carregado, antes lê as vendas do período em segundo plano."""
+        if historico_vendas.carregado: # Filtra as vendas já em memória, sem ler o armazenamento
+            self.iniciar_relatorio('relatorio_vendas', relatorio_vendas(tuple(historico_vendas.periodo(*periodo)), *periodo),
+                                   widget=widget, caminho=caminho)
+            return
+        self.descartar_relatorio()
+        if widget is not None:
+            widget.config(state=tk.NORMAL)
+            widget.delete('1.0', tk.END)
+            widget.config(state=tk.DISABLED)
+        self.leitura_vendas = historico_vendas.iniciar_leitura(*periodo)
+        self.progresso_relatorio.set(0.0)
+        self.label_status_relatorio.config(text="Lendo as vendas do período...")
+        self.botao_cancelar_relatorio.config(state=tk.NORMAL)
+        self.master.after(RELATORIO_INTERVALO_MS, self.aguardar_leitura_vendas, self.leitura_vendas, widget, caminho)
+
+    def aguardar_leitura_vendas(self, leitura, widget, caminho):
+        """Quando a leitura termina, junta a ela as vendas registradas enquanto isso e gera o relatório."""
+        if not leitura.terminou:
+            self.master.after(RELATORIO_INTERVALO_MS, self.aguardar_leitura_vendas, leitura, widget, caminho)
+            return
+        atual = leitura is self.leitura_vendas # Senão, foi cancelada ou substituída: só é encerrada
+        try:
+            vendas_periodo = historico_vendas.concluir_leitura(leitura)
+        except Exception as e:
+            if atual:
+                self.leitura_vendas = None
+                self.botao_cancelar_relatorio.config(state=tk.DISABLED)
+                self.label_status_relatorio.config(text="Falha ao gerar o relatório.")
+                messagebox.showerror("Erro no Relatório", f"Não foi possível ler as vendas: {e}")
+            return
+        if atual:
+            self.leitura_vendas = None
+            self.iniciar_relatorio('relatorio_vendas', relatorio_vendas(vendas_periodo, leitura.data_inicio, leitura.data_fim),
+                                   widget=widget, caminho=caminho)
+
+    def pedir_arquivo_relatorio(self, titulo):
+        return filedialog.asksaveasfilename(title=titulo, defaultextension=".csv", filetypes=[("CSV", "*.csv"), ("Texto", "*.txt")])
+
+    def iniciar_relatorio(self, nome, blocos, widget=None, caminho=None):
+        """Gera um relatório em segundo plano, mostrando-o no 'widget' aos poucos ou gravando-o em 'caminho'."""
+        self.descartar_relatorio() # Um relatório por vez: o novo substitui o que estiver em andamento
+        if widget is not None:
+            widget.config(state=tk.NORMAL)
+            widget.delete('1.0', tk.END)
+            widget.config(state=tk.DISABLED)
+        if caminho is not None:
+            blocos = gravar_relatorio(blocos, caminho)
+        self.progresso_relatorio.set(0.0)
+        self.label_status_relatorio.config(text=f"Gravando {caminho}..." if caminho else "Gerando relatório...")
+        self.botao_cancelar_relatorio.config(state=tk.NORMAL)
+        self.tarefa_relatorio = TarefaRelatorio(
+            self.master, nome, blocos,
+            ao_receber=(lambda texto: self.inserir_texto_relatorio(widget, texto)) if widget is not None else None,
+            ao_progredir=self.progresso_relatorio.set,
+            ao_terminar=lambda tarefa: self.ao_terminar_relatorio(tarefa, widget, caminho))
+
+    def inserir_texto_relatorio(self, widget, texto):
+        widget.config(state=tk.NORMAL)
+        widget.insert(tk.END, texto)
+        widget.config(state=tk.DISABLED)
+
+    def cancelar_relatorio(self):
+        if self.leitura_vendas is not None:
+            self.leitura_vendas = None # A leitura termina sozinha e é descartada em 'aguardar_leitura_vendas'
+            self.botao_cancelar_relatorio.config(state=tk.DISABLED)
+            self.label_status_relatorio.config(text="Relatório cancelado.")
+        if self.tarefa_relatorio is not None:
+            self.tarefa_relatorio.cancelar()
+
+    def descartar_relatorio(self):
+        """Cancela o relatório em andamento sem mexer mais na tela (outro conteúdo vai ocupar o lugar dele)."""
+        if self.leitura_vendas is not None:
+            self.leitura_vendas = None
+            self.botao_cancelar_relatorio.config(state=tk.DISABLED)
+            self.label_status_relatorio.config(text="")
+        if self.tarefa_relatorio is not None:
+            self.tarefa_relatorio.cancelar()
+            self.tarefa_relatorio = None
+            self.botao_cancelar_relatorio.config(state=tk.DISABLED)
+            self.label_status_relatorio.config(text="")
+
+    def ao_terminar_relatorio(self, tarefa, widget, caminho):
+        if tarefa is not self.tarefa_relatorio:
+            return # Descartado: a tela e a barra de progresso já pertencem a outro conteúdo
+        self.tarefa_relatorio = None
+        self.botao_cancelar_relatorio.config(state=tk.DISABLED)
+        if tarefa.erro is not None:
+            self.label_status_relatorio.config(text="Falha ao gerar o relatório.")
+            messagebox.showerror("Erro no Relatório", f"Não foi possível gerar o relatório: {tarefa.erro}")
+        elif tarefa.cancelada:
+            self.label_status_relatorio.config(text="Relatório cancelado.")
+            if widget is not None:
+                self.inserir_texto_relatorio(widget, "\n[Relatório cancelado]\n")
         else:
-            self.text_relatorio_estoque.insert(tk.END, f"--- Produtos com Estoque Abaixo ou Igual a {limite} Unidades ---\n\n")
-            for produto in produtos_baixo_estoque:
-                self.text_relatorio_estoque.insert(tk.END, f"Código: {produto['codigo']}\n")
-                self.text_relatorio_estoque.insert(tk.END, f"Nome: {produto['nome']}\n")
-                self.text_relatorio_estoque.insert(tk.END, f"Estoque: {produto['estoque']}\n")
-                self.text_relatorio_estoque.insert(tk.END, "-" * 30 + "\n")
-        self.text_relatorio_estoque.config(state=tk.DISABLED)
+            self.progresso_relatorio.set(1.0)
+            self.label_status_relatorio.config(text=f"Relatório gravado em {caminho}." if caminho else "Relatório concluído.")
+
+    def acao_relatorio_vendas_hoje(self):
+        """Preenche o período com a data de hoje e gera o relatório de vendas."""
+        hoje = datetime.now().strftime("%Y-%m-%d")
+        for entry in (self.entry_data_inicio, self.entry_data_fim):
+            entry.delete(0, tk.END)
+            entry.insert(0, hoje)
+        self.acao_relatorio_vendas()
+
+    def acao_resumo_vendas(self):
+        """Exibe o resumo do período a partir dos agregados de vendas, sem percorrer as vendas."""
+        periodo = self.ler_periodo_relatorio()
+        if periodo is None:
+            return
+        with Cronometro('SupermercadoApp.acao_resumo_vendas'): # Mede só o resumo, sem o tempo dos diálogos
+            self.exibir_resumo_vendas(periodo)
+
+    def exibir_resumo_vendas(self, periodo):
+        """Escreve o resumo do período na caixa de texto do relatório de vendas."""
+        data_inicio, data_fim = periodo
+        self.descartar_relatorio() # O resumo vai para a mesma caixa de texto do relatório de vendas
+        agregados_vendas = historico_vendas.agregados()
+        resumo = agregados_vendas.resumo(data_inicio, data_fim)
 
-    def acao_relatorio_vendas(self):
-        """Gera e exibe o relatório de todas as vendas."""
         self.text_relatorio_vendas.config(state=tk.NORMAL)
         self.text_relatorio_vendas.delete('1.0', tk.END)
-
-        if not vendas:
-            self.text_relatorio_vendas.insert(tk.END, "Nenhuma venda registrada ainda.\n")
+        descricao = "Todo o Período" if periodo == (None, None) else f"{data_inicio or 'início'} a {data_fim or 'hoje'}"
+        self.text_relatorio_vendas.insert(tk.END, f"--- Resumo de Vendas ({descricao}) ---\n\n")
+        if not resumo['quantidade_vendas']:
+            self.text_relatorio_vendas.insert(tk.END, "Nenhuma venda no período.\n")
         else:
-            total_geral = 0.0
-            self.text_relatorio_vendas.insert(tk.END, "--- Relatório de Todas as Vendas ---\n\n")
-            for i, venda in enumerate(vendas):
-                self.text_relatorio_vendas.insert(tk.END, f"Venda #{i+1} - Data/Hora: {venda['data_hora']}\n")
-                self.text_relatorio_vendas.insert(tk.END, "Itens:\n")
-                for item in venda['itens']:
-                    self.text_relatorio_vendas.insert(tk.END, f"  - {item['nome']} ({item['quantidade']}x) @ R$ {item['preco_unitario']:.2f} = R$ {item['subtotal']:.2f}\n")
-                self.text_relatorio_vendas.insert(tk.END, f"Total da Venda: R$ {venda['total']:.2f}\n")
-                self.text_relatorio_vendas.insert(tk.END, "=" * 40 + "\n\n")
-                total_geral += venda['total']
-            
-            self.text_relatorio_vendas.insert(tk.END, f"TOTAL GERAL ARRECADADO: R$ {total_geral:.2f}\n")
-        
+            self.text_relatorio_vendas.insert(tk.END, f"Vendas realizadas: {resumo['quantidade_vendas']}\n")
+            self.text_relatorio_vendas.insert(tk.END, f"Total arrecadado: R$ {resumo['total']:.2f}\n")
+            self.text_relatorio_vendas.insert(tk.END, f"Ticket médio: R$ {resumo['total'] / resumo['quantidade_vendas']:.2f}\n\n")
+            self.text_relatorio_vendas.insert(tk.END, "Por dia:\n")
+            for dia, (total_dia, quantidade_dia) in resumo['dias']:
+                self.text_relatorio_vendas.insert(tk.END, f"  {dia}: {quantidade_dia} venda(s) - R$ {total_dia:.2f}\n")
+        mais_vendidos = agregados_vendas.produtos_mais_vendidos()
+        if mais_vendidos:
+            self.text_relatorio_vendas.insert(tk.END, "\nProdutos com maior receita (todo o período):\n")
+            for codigo, nome, unidades, receita in mais_vendidos:
+                self.text_relatorio_vendas.insert(tk.END, f"  - {nome} ({codigo}): {unidades} un. - R$ {receita:.2f}\n")
         self.text_relatorio_vendas.config(state=tk.DISABLED)
 
+    def acao_analise_vendas(self):
+        """Exibe as análises de vendas do período, calculadas sobre o cache colunar."""
+        periodo = self.ler_periodo_relatorio()
+        if periodo is None:
+            return
+        self.master.config(cursor="watch")
+        self.master.update_idletasks()
+        try:
+            with Cronometro('SupermercadoApp.acao_analise_vendas'): # Mede só a análise, sem o tempo dos diálogos
+                linhas = analise_vendas.formatar_analise(analisar_vendas(*periodo))
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Erro na Análise", f"Não foi possível analisar as vendas: {e}")
+            return
+        finally:
+            self.master.config(cursor="")
+        self.text_analise_vendas.config(state=tk.NORMAL)
+        self.text_analise_vendas.delete('1.0', tk.END)
+        self.text_analise_vendas.insert(tk.END, "\n".join(linhas) + "\n")
+        self.text_analise_vendas.config(state=tk.DISABLED)
+
+    def atualizar_desempenho_gui(self):
+        """Mostra na aba Desempenho o resumo atual dos histogramas de latência."""
+        self.tree_desempenho.delete(*self.tree_desempenho.get_children())
+        for operacao, valores in medidor_desempenho.resumo().items():
+            self.tree_desempenho.insert("", tk.END, values=(operacao, valores['contagem'],
+                                        *(f"{valores[chave] * 1000:.3f}" for chave in ('media_s', 'p50_s', 'p95_s', 'p99_s', 'max_s'))))
+
+    def atualizar_desempenho_periodicamente(self):
+        if medidor_desempenho.ativo and self.notebook.select() == str(self.tab_desempenho):
+            self.atualizar_desempenho_gui()
+        self.master.after(DESEMPENHO_ATUALIZAR_TELA_MS, self.atualizar_desempenho_periodicamente)
+
+    def acao_zerar_desempenho(self):
+        medidor_desempenho.zerar()
+        self.atualizar_desempenho_gui()
+
+    def acao_exportar_desempenho(self):
+        """Exporta os percentis de latência para um arquivo JSON ou CSV."""
+        caminho = filedialog.asksaveasfilename(title="Exportar desempenho", defaultextension=".json",
+                                               filetypes=[("JSON", "*.json"), ("CSV", "*.csv")])
+        if not caminho:
+            return
+        try:
+            medidor_desempenho.exportar(caminho)
+        except OSError as e:
+            messagebox.showerror("Erro na Exportação", f"Não foi possível gravar '{caminho}': {e}")
+            return
+        messagebox.showinfo("Exportação Concluída", f"Desempenho exportado para '{caminho}'.")
 
 # --- Execução da Aplicação ---
 if __name__ == "__main__":
+    # --desempenho: mede a latência das operações desde o início; --desempenho-exportar ARQ também a grava periodicamente em ARQ
+    if '--desempenho-exportar' in sys.argv[1:]:
+        indice_arg = sys.argv.index('--desempenho-exportar') + 1
+        if indice_arg >= len(sys.argv):
+            sys.exit("Uso: python supermercado_gui.py --desempenho-exportar ARQUIVO.json|ARQUIVO.csv")
+        DESEMPENHO_EXPORTAR_ARQUIVO = sys.argv[indice_arg]
+    if '--desempenho' in sys.argv[1:] or DESEMPENHO_EXPORTAR_ARQUIVO:
+        medidor_desempenho.ativo = True
+    if DESEMPENHO_EXPORTAR_ARQUIVO:
+        medidor_desempenho.exportar_periodicamente(DESEMPENHO_EXPORTAR_ARQUIVO)
+
+    # --cliente: este caixa usa o catálogo e as vendas do servidor PDV (iniciado com --servidor)
+    try:
+        inicializar_dados('remoto' if '--cliente' in sys.argv[1:] else None)
+    except ErroServidorPDV as e:
+        sys.exit(str(e))
+
+    if '--servidor' in sys.argv[1:]:
+        print(f"Servidor PDV atendendo em {SERVIDOR_PDV_HOST}:{SERVIDOR_PDV_PORTA}. Ctrl+C para encerrar.")
+        try:
+            asyncio.run(ServidorPDV().executar())
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    if '--uso-memoria' in sys.argv[1:]:
+        print(f"Catálogo: {len(produtos)} produtos, {produtos.uso_memoria() / 2**20:.1f} MiB")
+        vendas = historico_vendas.lista()
+        print(f"Histórico: {len(vendas)} vendas, {historico_vendas.uso_memoria() / 2**20:.1f} MiB")
+        sys.exit(0)
+    if '--compactar-vendas' in sys.argv[1:]:
+        if not isinstance(armazenamento, ArmazenamentoJSON):
+            sys.exit("A compactação do journal só se aplica ao armazenamento JSON.")
+        armazenamento.journal.compactar()
+        print(f"Journal compactado nas partições de {VENDAS_PARTICOES_DIR}/: {len(historico_vendas.lista())} vendas.")
+        sys.exit(0)
+    if '--processar-lote' in sys.argv[1:]:
+        # Reprocessa vendas feitas offline: um arquivo JSON com a lista de carrinhos aceita por MotorCheckout.finalizar_lote
+        indice_arg = sys.argv.index('--processar-lote') + 1
+        if indice_arg >= len(sys.argv):
+            sys.exit("Uso: python supermercado_gui.py --processar-lote ARQUIVO.json")
+        with open(sys.argv[indice_arg], 'r', encoding='utf-8') as f:
+            carrinhos = json.load(f)
+        vendas_concluidas, rejeitados = motor_checkout.finalizar_lote(carrinhos)
+        for indice, erro in rejeitados:
+            print(f"Carrinho #{indice + 1} rejeitado: {erro}")
+        print(f"{len(vendas_concluidas)} venda(s) registrada(s), {len(rejeitados)} rejeitada(s).")
+        sys.exit(0)
+    if '--importar-csv' in sys.argv[1:] or '--exportar-csv' in sys.argv[1:]:
+        opcao = '--importar-csv' if '--importar-csv' in sys.argv[1:] else '--exportar-csv'
+        indice_arg = sys.argv.index(opcao) + 1
+        if indice_arg >= len(sys.argv):
+            sys.exit(f"Uso: python supermercado_gui.py {opcao} ARQUIVO.csv")
+        try:
+            if opcao == '--importar-csv':
+                print(resumo_importacao(importar_produtos_csv(sys.argv[indice_arg])))
+            else:
+                print(f"{exportar_produtos_csv(sys.argv[indice_arg])} produto(s) exportado(s) para {sys.argv[indice_arg]}.")
+        except (OSError, ValueError, csv.Error, ErroServidorPDV) as e:
+            sys.exit(str(e))
+        sys.exit(0)
+    if '--analise-vendas' in sys.argv[1:]:
+        # Opcionalmente seguido do período: --analise-vendas [AAAA-MM-DD [AAAA-MM-DD]]
+        indice_arg = sys.argv.index('--analise-vendas') + 1
+        periodo = [arg for arg in sys.argv[indice_arg:indice_arg + 2] if not arg.startswith('--')]
+        try:
+            resultado = analisar_vendas(*periodo)
+            print("\n".join(analise_vendas.formatar_analise(resultado)))
+        except (RuntimeError, OSError, ValueError) as e:
+            sys.exit(str(e))
+        sys.exit(0)
+    if '--migrar-sqlite' in sys.argv[1:]:
+        try:
+            total_produtos, total_vendas = migrar_json_para_sqlite()
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"Migração concluída para {SQLITE_FILE}: {total_produtos} produtos e {total_vendas} vendas.")
+        sys.exit(0)
+
     root = tk.Tk()
     app = SupermercadoApp(root)
     root.mainloop()
\ No newline at end of file